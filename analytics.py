@@ -0,0 +1,240 @@
+"""
+Агрегаты по журналу сессий для /stats и /failed_queries.
+
+События своего процесса учитываются сразу при записи в журнал (SessionLog.write), поэтому
+команды не ждут записи журнала на диск. Журналы остальных воркеров вебхука дочитываются
+с диска — периодически и перед ответом на команду, — и их события видны с задержкой
+до SESSION_LOG_FLUSH_INTERVAL. Агрегаты сохраняются на диск вместе с позициями журналов,
+поэтому после перезапуска дочитывается только хвост.
+Пересобрать агрегаты по всему журналу заново:
+
+    python analytics.py --rebuild
+"""
+import argparse
+import asyncio
+import copy
+import heapq
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+
+from config import ANALYTICS_CHECKPOINT_FILE, ANALYTICS_CHECKPOINT_INTERVAL, FAILED_QUERIES_LIMIT
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+# Сколько пользователей помнить время последней отправки рекомендаций (см. apply)
+LAST_RESULTS_LIMIT = 10000
+
+
+class SessionAggregates:
+    """
+    Счётчики событий и запросы, после которых не было отправлено рекомендаций.
+
+    Запрос пользователя остаётся открытым, пока не придёт result_sent (запрос обслужен)
+    или следующий запрос того же пользователя (запрос остаётся необслуженным).
+    Хранятся только последние необслуженные запросы — столько, сколько может показать
+    /failed_queries, — поэтому обе команды отвечают за время, не зависящее от размера журнала.
+    """
+
+    def __init__(self, path=ANALYTICS_CHECKPOINT_FILE, checkpoint_interval=ANALYTICS_CHECKPOINT_INTERVAL,
+                 keep_failed=FAILED_QUERIES_LIMIT):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.keep_failed = keep_failed
+        self._reset()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def _reset(self):
+        self.event_counts = {}
+        # Запросы с корректным временем и сколько из них закончилось отправкой рекомендаций
+        self.queries = 0
+        self.converted = 0
+        self._seq = 0
+        # user_id -> номер открытого запроса
+        self._open = {}
+        # номер запроса -> [timestamp, user_id, username, text] для последних необслуженных запросов
+        self._unconverted = OrderedDict()
+        # user_id -> время последнего result_sent для последних LAST_RESULTS_LIMIT пользователей
+        self._last_results = OrderedDict()
+        # путь журнала -> позиция, до которой он учтён (см. SessionLogReader.iter_since)
+        self._positions = {}
+
+    def apply(self, rows):
+        """Учитывает события: строки [timestamp, user_id, username, event, text]."""
+        for timestamp, user_id, username, event, text in rows:
+            user_id = str(user_id)
+            self.event_counts[event] = self.event_counts.get(event, 0) + 1
+            # События с повреждённым временем не участвуют в анализе конверсии
+            if not TIMESTAMP_PATTERN.fullmatch(timestamp):
+                continue
+            if event == "query":
+                self._seq += 1
+                self.queries += 1
+                # Уточнение мог обработать другой воркер: его result_sent учтён раньше этого запроса
+                if self._last_results.get(user_id, "") > timestamp:
+                    self.converted += 1
+                    self._open.pop(user_id, None)
+                    continue
+                self._open[user_id] = self._seq
+                self._unconverted[self._seq] = [timestamp, user_id, username, text]
+                if len(self._unconverted) > self.keep_failed:
+                    self._unconverted.popitem(last=False)
+            elif event == "result_sent":
+                self._last_results[user_id] = max(timestamp, self._last_results.pop(user_id, ""))
+                if len(self._last_results) > LAST_RESULTS_LIMIT:
+                    self._last_results.popitem(last=False)
+                seq = self._open.pop(user_id, None)
+                if seq is not None:
+                    self.converted += 1
+                    self._unconverted.pop(seq, None)
+
+    def failed_queries(self):
+        """Последние необслуженные запросы по времени и общее число таких запросов."""
+        return list(self._unconverted.values()), self.queries - self.converted
+
+    def _state(self):
+        return {
+            "event_counts": self.event_counts,
+            "queries": self.queries,
+            "converted": self.converted,
+            "seq": self._seq,
+            "open": self._open,
+            "unconverted": list(self._unconverted.items()),
+            "last_results": list(self._last_results.items()),
+            "positions": self._positions,
+        }
+
+    def _write(self, text):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, self.path)
+
+    def _new_rows(self, logs):
+        """
+        События журналов после сохранённых позиций в порядке времени и позиции после них.
+        Уточнение может обработать другой воркер, поэтому события разных журналов сливаются по времени.
+        """
+        positions = {log.path: copy.deepcopy(self._positions.get(log.path, {})) for log in logs}
+        streams = [log.iter_since(positions[log.path]) for log in logs]
+        return heapq.merge(*streams, key=lambda row: row[0]), positions
+
+    def _catch_up(self, logs):
+        rows, positions = self._new_rows(logs)
+        self.apply(rows)
+        self._positions.update(positions)
+
+    async def refresh(self, logs):
+        """
+        Дочитывает события журналов logs (других воркеров), записанные после прошлого обновления.
+        Файлы читаются в потоке, агрегаты меняются в event loop; обновления идут по одному.
+        """
+        async with self._lock:
+            def read():
+                rows, positions = self._new_rows(logs)
+                return list(rows), positions
+
+            rows, positions = await asyncio.to_thread(read)
+            self.apply(rows)
+            self._positions.update(positions)
+
+    async def checkpoint(self, log):
+        """Сохраняет агрегаты вместе с позициями журналов, до которых они посчитаны."""
+        # События своего журнала учтены при записи: позиция — его конец, когда очередь записана
+        await log.flush()
+        self._positions[log.path] = log.position()
+        # Снимок делается в event loop: пока файл пишется в потоке, агрегаты могут меняться
+        text = json.dumps(self._state(), ensure_ascii=False)
+        try:
+            await asyncio.to_thread(self._write, text)
+        except OSError:
+            logger.exception("Не удалось сохранить %s", self.path)
+
+    async def _refresh_periodically(self, log, other_logs):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.refresh(other_logs())
+                await self.checkpoint(log)
+            except Exception:
+                logger.exception("Не удалось обновить агрегаты журнала сессий")
+
+    def start(self, log, other_logs):
+        """
+        Подписывается на события журнала log этого процесса и запускает периодическое
+        обновление по журналам остальных воркеров (other_logs() возвращает их список) и сохранение.
+        """
+        log.add_listener(self)
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_periodically(log, other_logs))
+
+    async def close(self, log, other_logs):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.refresh(other_logs)
+        await self.checkpoint(log)
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        self.event_counts = state["event_counts"]
+        self.queries = state["queries"]
+        self.converted = state["converted"]
+        self._seq = state["seq"]
+        self._open = state["open"]
+        self._unconverted = OrderedDict((seq, row) for seq, row in state["unconverted"])
+        self._last_results = OrderedDict(state["last_results"])
+        self._positions = state["positions"]
+
+    def restore(self, logs):
+        """
+        Загружает сохранённые агрегаты и дочитывает события журналов logs, записанные после них.
+        Если сохранения нет или оно повреждено, пересчитывает агрегаты по всем журналам.
+        """
+        try:
+            self._load()
+        except FileNotFoundError:
+            self.rebuild(logs)
+            return
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Агрегаты в %s не читаются (%s), пересчитываю по журналу", self.path, e)
+            self.rebuild(logs)
+            return
+        self._catch_up(logs)
+
+    def rebuild(self, logs):
+        """Пересчитывает агрегаты по всем сегментам журналов всех воркеров."""
+        self._reset()
+        self._catch_up(logs)
+        self._write(json.dumps(self._state(), ensure_ascii=False))
+
+
+session_aggregates = SessionAggregates()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Агрегаты журнала сессий")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать агрегаты по всему журналу")
+    args = parser.parse_args()
+
+    from session_log import worker_logs
+    if args.rebuild:
+        session_aggregates.rebuild(worker_logs())
+    else:
+        session_aggregates.restore(worker_logs())
+    failed, failed_total = session_aggregates.failed_queries()
+    print(json.dumps({"event_counts": session_aggregates.event_counts, "failed_queries": failed_total},
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
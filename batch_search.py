@@ -0,0 +1,96 @@
+"""
+Пакетный прогон запросов через поисковый индекс.
+
+Читает JSONL из stdin (по строке на запрос: {"query": "..."} или просто строка JSON)
+либо запросы из журнала сессий (со всеми сегментами и журналами всех воркеров), и пишет в stdout JSONL с результатами:
+
+    python batch_search.py < queries.jsonl > results.jsonl
+    python batch_search.py --sessions sessions.csv > results.jsonl
+
+Запросы обрабатываются пачками по --chunk-size, поэтому память не растёт с длиной входа.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import sys
+
+from config import DATASET_FILE, INDEX_DIR
+from data import ProductSearch, IndexStaleError
+from session_log import SessionLogReader
+from worker_files import worker_paths
+
+
+def load_search(csv_file, index_dir):
+    """Берёт предсобранный индекс, если он собран из csv_file, иначе строит индекс из CSV."""
+    try:
+        return ProductSearch.load(index_dir, csv_file)
+    except IndexStaleError:
+        return ProductSearch(csv_file)
+
+
+def read_jsonl_queries(stream, field):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        yield record if isinstance(record, str) else record[field]
+
+
+def read_session_queries(path):
+    """
+    Запросы (event=query) из журнала сессий path вместе с его закрытыми сегментами и журналами
+    остальных воркеров вебхука (sessions-1.csv, ...) в порядке времени.
+    """
+    paths = worker_paths(path)
+    if not paths:
+        raise FileNotFoundError(path)
+    logs = [SessionLogReader(log_path) for log_path in paths]
+    streams = [itertools.chain.from_iterable(log.iter_segment(segment) for segment in log.segments())
+               for log in logs]
+    for row in heapq.merge(*streams, key=lambda row: row["timestamp"]):
+        # Последняя запись активного журнала может быть ещё не дописана
+        if row["event"] == "query" and row["text"] is not None:
+            yield row["text"]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный поиск товаров по запросам")
+    parser.add_argument("--csv", default=DATASET_FILE, help="CSV с товарами")
+    parser.add_argument("--index", default=INDEX_DIR, help="каталог предсобранного индекса")
+    parser.add_argument("--sessions", help="брать запросы (event=query) из лога сессий вместо stdin")
+    parser.add_argument("--field", default="query", help="поле JSON с текстом запроса")
+    parser.add_argument("--chunk-size", type=int, default=256, help="запросов в одной пачке")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--top-n", type=int, default=3)
+    args = parser.parse_args()
+
+    search = load_search(args.csv, args.index)
+    if args.sessions:
+        queries = read_session_queries(args.sessions)
+    else:
+        queries = read_jsonl_queries(sys.stdin, args.field)
+
+    for chunk in chunked(queries, args.chunk_size):
+        for query, (results, need_clarification) in zip(chunk, search.search_batch(chunk, args.threshold, args.top_n)):
+            record = {
+                "query": query,
+                "need_clarification": bool(need_clarification),
+                "results": [
+                    {"name": r["name"], "price": float(r["price"]), "link": r["link"], "score": float(r["score"])}
+                    for r in results
+                ],
+            }
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Полнота и скорость инвертированного бэкенда относительно точного перебора.
+
+    python -m benchmarks.bench_ann --rows 1000000 --queries 200 --depth 0 1000 100
+
+depth 0 означает обход без ограничения глубины (отсечение только по границам MaxScore).
+Печатает JSON с recall@k и средним временем запроса для каждого варианта.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import make_queries, write_catalog
+from data import ProductSearch
+from retrieval import ExactBackend, InvertedIndexBackend, recall_at_k
+
+
+def _mean_ms(backend, query_matrix, candidates_list, k):
+    started = time.perf_counter()
+    for i, candidates in enumerate(candidates_list):
+        backend.top_k(query_matrix[i], k, candidates)
+    return (time.perf_counter() - started) / max(len(candidates_list), 1) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--depth", type=int, nargs="+", default=[0, 1000, 100])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        search = ProductSearch(write_catalog(os.path.join(tmp, "catalog.csv"), args.rows))
+
+    parsed = [search.filters.parse(query) for query in make_queries(args.queries)]
+    query_matrix = search.vectorizer.transform([p.text for p in parsed])
+    candidates_list = [search.filters.candidates(p) for p in parsed]
+
+    exact = ExactBackend(search.tfidf_matrix)
+    report = {
+        "rows": args.rows,
+        "queries": len(parsed),
+        "k": args.k,
+        "exact_ms": _mean_ms(exact, query_matrix, candidates_list, args.k),
+        "inverted": [],
+    }
+    for depth in args.depth:
+        backend = InvertedIndexBackend(search.tfidf_matrix, depth=depth or None)
+        report["inverted"].append({
+            "depth": depth or None,
+            "recall": recall_at_k(backend, exact, query_matrix, args.k, candidates_list),
+            "mean_ms": _mean_ms(backend, query_matrix, candidates_list, args.k),
+        })
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
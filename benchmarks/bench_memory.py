@@ -0,0 +1,177 @@
+"""
+Память под товары: pandas DataFrame (как хранил товары ProductSearch раньше) против ProductStore.
+
+    python -m benchmarks.bench_memory --sizes dataset,100000,1000000 --workers 4 --output memory.json
+
+Каждый вариант замеряется в отдельном процессе по приросту памяти после сборки структуры:
+- dataframe — DataFrame со столбцами товаров и списки столбцов, которые строил ProductSearch._prepare;
+- store — ProductStore в памяти процесса;
+- mmap — ProductStore, загруженный с диска через mmap в workers процессах одновременно; каждый
+  процесс читает все товары, а pss показывает, что страницы делятся между процессами.
+Кроме памяти замеряется время чтения полей товара по случайным позициям.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.report import environment, latency_summary, memory_mb, write_report
+from benchmarks.synthetic import write_catalog
+from config import DATASET_FILE
+from ingest import IngestReport, read_catalog
+
+DEFAULT_SIZES = "dataset,100000,1000000"
+FIELDS = ("name", "category", "description", "price", "link")
+
+
+def _rows(csv_file):
+    for chunk in read_catalog(csv_file, IngestReport()):
+        yield from chunk
+
+
+def _build_dataframe(csv_file):
+    import pandas as pd
+
+    columns = {name: [] for name in ("id",) + FIELDS}
+    for row in _rows(csv_file):
+        for name, values in columns.items():
+            values.append(getattr(row, name))
+    return pd.DataFrame(columns)
+
+
+def _build_store(csv_file):
+    import numpy as np
+    from product_store import ProductStore, encode_records, offsets_from_lengths
+    from query_parser import ProductLabels
+
+    labels = ProductLabels()
+    strings, lengths, prices, category_ids = [], [], [], []
+    for chunk in read_catalog(csv_file, IngestReport()):
+        buffer, chunk_lengths = encode_records((row.id, row.name, row.description, row.link) for row in chunk)
+        strings.append(buffer)
+        lengths.append(chunk_lengths)
+        prices.extend(row.price for row in chunk)
+        category_ids.extend(labels.label(row.name, row.category)[0] for row in chunk)
+    return ProductStore(b"".join(strings), offsets_from_lengths(np.concatenate(lengths)),
+                        prices, category_ids, labels.category_names)
+
+
+def _access_timings(read, size, count=10000, seed=0):
+    rng = random.Random(seed)
+    timings = []
+    for _ in range(count):
+        position = rng.randrange(size)
+        started = time.perf_counter()
+        read(position)
+        timings.append(time.perf_counter() - started)
+    return latency_summary(timings)
+
+
+def _read_store(store, position):
+    return (store.get(position, "name"), store.category(position), store.get(position, "description"),
+            store.price(position), store.get(position, "link"))
+
+
+def _touch_mmap(store_dir, barrier, results):
+    """Воркер варианта mmap: загружает хранилище, читает все товары и ждёт остальных перед замером."""
+    from product_store import ProductStore
+
+    before = memory_mb()
+    store = ProductStore.load(store_dir)
+    for position in range(len(store)):
+        _read_store(store, position)
+    barrier.wait()
+    after = memory_mb()
+    results.put({name: after[name] - before.get(name, 0.0) for name in after})
+    barrier.wait()
+
+
+def measure(size, mode, workers):
+    """Замер одного варианта в текущем процессе."""
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = DATASET_FILE if size == "dataset" else write_catalog(os.path.join(tmp, "catalog.csv"), int(size))
+        gc.collect()
+        before = memory_mb()
+        result = {"size": size, "mode": mode}
+
+        if mode == "dataframe":
+            df = _build_dataframe(csv_file)
+            gc.collect()
+            result["structure_mb"] = df.memory_usage(deep=True).sum() / 1024 / 1024
+            result["memory_mb"] = {name: value - before[name] for name, value in memory_mb().items()}
+            # ProductSearch._prepare дополнительно держал столбцы списками для выдачи
+            lists = {name: df[name].tolist() for name in FIELDS if name != "price"}
+            prices = df["price"].to_numpy()
+            gc.collect()
+            result["with_lists_memory_mb"] = {name: value - before[name] for name, value in memory_mb().items()}
+            result["products"] = len(df)
+            result["access"] = _access_timings(
+                lambda p: (lists["name"][p], lists["category"][p], lists["description"][p], prices[p],
+                           lists["link"][p]), len(df))
+            result["access_iloc"] = _access_timings(lambda p: df.iloc[p].to_dict(), len(df), count=2000)
+            return result
+
+        store = _build_store(csv_file)
+        result["products"] = len(store)
+        result["structure_mb"] = store.nbytes / 1024 / 1024
+        if mode == "store":
+            gc.collect()
+            result["memory_mb"] = {name: value - before[name] for name, value in memory_mb().items()}
+            result["access"] = _access_timings(lambda p: _read_store(store, p), len(store))
+            return result
+
+        store_dir = os.path.join(tmp, "store")
+        os.makedirs(store_dir)
+        store.save(store_dir)
+        del store
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(workers)
+        results = context.Queue()
+        processes = [context.Process(target=_touch_mmap, args=(store_dir, barrier, results))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        result["workers"] = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="размеры каталога через запятую; dataset — настоящий dataset.csv")
+    parser.add_argument("--modes", default="dataframe,store,mmap")
+    parser.add_argument("--workers", type=int, default=4, help="число процессов для варианта mmap")
+    parser.add_argument("--output", help="файл для отчёта JSON (по умолчанию stdout)")
+    parser.add_argument("--single", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(measure(args.single[0], args.single[1], args.workers)))
+        return
+
+    runs = []
+    for size in args.sizes.split(","):
+        for mode in args.modes.split(","):
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_memory", "--single", size.strip(), mode.strip(),
+                 "--workers", str(args.workers)],
+                capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                runs.append({"size": size, "mode": mode, "error": completed.stderr.strip().splitlines()[-1:]})
+                continue
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            print(f"{size} {mode}: готово", file=sys.stderr)
+    write_report({"benchmark": "memory", "environment": environment(), "runs": runs}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Масштабирование ProductSearch: сборка индекса и поиск на каталогах от dataset.csv до 1M товаров.
+
+    python -m benchmarks.bench_scaling --sizes dataset,1000,10000,100000,1000000 --output scaling.json
+
+Каждый размер замеряется в отдельном процессе, чтобы пиковая память не накапливалась
+между прогонами. В отчёт попадают время ProductSearch.__init__, сохранения и загрузки
+индекса, перцентили задержки search, пропускная способность search и search_batch
+и пиковый RSS процесса.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.report import environment, latency_summary, peak_rss_mb, write_report
+from benchmarks.synthetic import make_queries, write_catalog
+from config import DATASET_FILE
+
+DEFAULT_SIZES = "dataset,1000,10000,100000,1000000"
+
+
+def measure(size, query_count, batch_size):
+    """Замер одного размера каталога в текущем процессе."""
+    from data import ProductSearch
+
+    queries = make_queries(query_count)
+    with tempfile.TemporaryDirectory() as tmp:
+        if size == "dataset":
+            csv_file = DATASET_FILE
+        else:
+            csv_file = write_catalog(os.path.join(tmp, "catalog.csv"), int(size))
+        started = time.perf_counter()
+        search = ProductSearch(csv_file)
+        build_seconds = time.perf_counter() - started
+
+        index_dir = os.path.join(tmp, "index")
+        started = time.perf_counter()
+        search.save(index_dir)
+        save_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        loaded = ProductSearch.load(index_dir, csv_file)
+        load_seconds = time.perf_counter() - started
+
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            loaded.search(query)
+            timings.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for offset in range(0, len(queries), batch_size):
+            for _ in loaded.search_batch(queries[offset:offset + batch_size]):
+                pass
+        batch_seconds = time.perf_counter() - started
+
+    return {
+        "size": size,
+        "products": len(search.products),
+        "vocabulary": len(search.vectorizer.vocabulary_),
+        "build_seconds": build_seconds,
+        "save_seconds": save_seconds,
+        "load_seconds": load_seconds,
+        "search": latency_summary(timings),
+        "search_qps": len(timings) / sum(timings),
+        "search_batch_qps": len(queries) / batch_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="размеры каталога через запятую; dataset — настоящий dataset.csv")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", help="файл для отчёта JSON (по умолчанию stdout)")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(measure(args.single, args.queries, args.batch_size)))
+        return
+
+    runs = []
+    for size in args.sizes.split(","):
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_scaling", "--single", size.strip(),
+             "--queries", str(args.queries), "--batch-size", str(args.batch_size)],
+            capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            runs.append({"size": size, "error": completed.stderr.strip().splitlines()[-1:]})
+            continue
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        print(f"{size}: готово", file=sys.stderr)
+    write_report({"benchmark": "scaling", "environment": environment(), "runs": runs}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Сравнение ProductSearch.search с эталонной реализацией на синтетическом каталоге.
+
+    python -m benchmarks.bench_search --rows 1000000 --queries 200
+
+Проверяет, что обе реализации возвращают одинаковые результаты, и печатает
+JSON со временем одного запроса для каждой из них. У эталона нет фильтров по категории
+и атрибутам (см. query_parser.py), поэтому запросы с такими фильтрами в сверку не входят.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.legacy_search import LegacyProductSearch
+from benchmarks.synthetic import make_queries, write_catalog
+from data import ProductSearch
+
+
+def _key(results):
+    results, need_clarification = results
+    return [(r['name'], r['link'], round(float(r['score']), 9)) for r in results], bool(need_clarification)
+
+
+def _timed(fn, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - started)
+    return {
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": statistics.median(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = write_catalog(os.path.join(tmp, "catalog.csv"), args.rows)
+        started = time.perf_counter()
+        search = ProductSearch(csv_file)
+        build_seconds = time.perf_counter() - started
+        legacy = LegacyProductSearch(search)
+
+    queries = make_queries(args.queries)
+    parsed = {q: search.filters.parse(q) for q in queries}
+    filtered = [q for q in queries if parsed[q].categories or parsed[q].attributes]
+    mismatches = [q for q in queries if q not in filtered and _key(search.search(q)) != _key(legacy.search(q))]
+    report = {
+        "rows": args.rows,
+        "queries": len(queries),
+        "filtered_queries": len(filtered),
+        "build_seconds": build_seconds,
+        "mismatches": mismatches,
+        "legacy": _timed(legacy.search, queries),
+        "vectorized": _timed(search.search, queries),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
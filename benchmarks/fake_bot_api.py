@@ -0,0 +1,118 @@
+"""
+Локальная заглушка Telegram Bot API для проверки отправки сообщений под нагрузкой.
+
+    python -m benchmarks.fake_bot_api --port 8081 --chat-rate 1 --chat-burst 3 --global-rate 30
+    TELEGRAM_API_SERVER=http://127.0.0.1:8081 python webhook.py --no-set-webhook
+
+Отвечает на send*-методы правдоподобными объектами Message и, как настоящий Telegram,
+возвращает 429 с retry_after, если бот превышает частоту отправки в чат или в целом.
+GET /stats отдаёт JSON со счётчиками запросов и отказов по методам.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+
+class FakeBotAPI:
+    def __init__(self, chat_rate=1.0, chat_burst=3, global_rate=30.0, latency=0.0):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_rate = global_rate
+        self.latency = latency
+        self._message_ids = itertools.count(1)
+        # chat_id -> [токены, момент обновления]; "" — общий лимит бота
+        self._buckets = {}
+        self.requests = {}
+        self.rejected = {}
+        self.messages = []
+
+    def _take(self, key, rate, capacity):
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+        self._buckets[key] = (tokens - 1, now)
+        return 0
+
+    async def _params(self, request):
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post())
+
+    def _message(self, method, params):
+        chat_id = params.get("chat_id")
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id) if str(chat_id).lstrip("-").isdigit() else 0, "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if method == "senddocument":
+            message["document"] = {"file_id": "fake", "file_unique_id": "fake"}
+        return message
+
+    async def handle(self, request):
+        method = request.match_info["method"].lower()
+        params = await self._params(request)
+        self.requests[method] = self.requests.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == "getme":
+            return web.json_response({"ok": True, "result": BOT_USER})
+        if not method.startswith("send"):
+            return web.json_response({"ok": True, "result": True})
+
+        chat_id = str(params.get("chat_id"))
+        wait = max(self._take(chat_id, self.chat_rate, self.chat_burst),
+                   self._take("", self.global_rate, self.global_rate))
+        if wait:
+            self.rejected[method] = self.rejected.get(method, 0) + 1
+            retry_after = max(1, round(wait))
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            })
+        message = self._message(method, params)
+        self.messages.append({"method": method, "chat_id": chat_id, "text": params.get("text")})
+        return web.json_response({"ok": True, "result": message})
+
+    async def stats(self, request):
+        return web.json_response({"requests": self.requests, "rejected": self.rejected,
+                                  "messages": len(self.messages)})
+
+
+def create_app(fake_api):
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", fake_api.handle)
+    app.router.add_get("/stats", fake_api.stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chat-rate", type=float, default=1.0, help="сообщений в секунду на чат")
+    parser.add_argument("--chat-burst", type=int, default=3, help="сообщений подряд в один чат")
+    parser.add_argument("--global-rate", type=float, default=30.0, help="сообщений в секунду всего")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа в секундах")
+    args = parser.parse_args()
+
+    fake_api = FakeBotAPI(args.chat_rate, args.chat_burst, args.global_rate, args.latency)
+    print(json.dumps({"listening": f"http://{args.host}:{args.port}"}))
+    web.run_app(create_app(fake_api), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Эталонная реализация ProductSearch.search до векторизации (pandas-маска, argsort, df.loc).
+Используется бенчмарками для сравнения скорости и проверки совпадения результатов.
+"""
+import re
+
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+
+class LegacyProductSearch:
+    """
+    Индекс в прежнем виде: товары в pandas DataFrame, как их хранил ProductSearch до ProductStore.
+    Векторизатор и TF-IDF матрица берутся из search, строки DataFrame — товары в порядке позиций индекса.
+    """
+
+    def __init__(self, search):
+        products = search.products
+        self.vectorizer = search.vectorizer
+        self.tfidf_matrix = search.tfidf_matrix
+        self.df = pd.DataFrame({
+            "name": list(products.column("name")),
+            "category": [products.category(position) for position in range(len(products))],
+            "description": list(products.column("description")),
+            "price": [products.price(position) for position in range(len(products))],
+            "link": list(products.column("link")),
+        })
+
+    def search(self, query, threshold=0.2, top_n=3):
+        return legacy_search(self, query, threshold, top_n)
+
+
+def legacy_search(self, query, threshold=0.2, top_n=3):
+    """Поиск по LegacyProductSearch так, как он был реализован до векторизации."""
+    # Ищем шаблон "до <число> рублей" в запросе
+    price_limit = None
+    price_pattern = re.compile(r'до\s*(\d+)\s*руб', re.IGNORECASE)
+    price_match = price_pattern.search(query)
+    if price_match:
+        price_limit = float(price_match.group(1))
+        # Удаляем часть запроса с фильтром цены, чтобы она не влияла на поиск по тексту
+        query = price_pattern.sub('', query).strip()
+
+    # Преобразуем запрос в вектор
+    query_vec = self.vectorizer.transform([query])
+
+    # Если указано ограничение по цене, сначала фильтруем товары
+    if price_limit is not None:
+        price_mask = self.df['price'].notnull() & (self.df['price'] < price_limit)
+        if not price_mask.any():
+            # Если нет товаров с подходящей ценой, возвращаем пустой список
+            return [], True
+        filtered_indices = self.df.index[price_mask]
+        # Вычисляем похожесть только для отфильтрованных товаров
+        similarities = cosine_similarity(query_vec, self.tfidf_matrix[filtered_indices]).flatten()
+        sorted_idx = similarities.argsort()[::-1][:top_n]
+        result_indices = filtered_indices[sorted_idx]
+    else:
+        # Если ограничения по цене нет, считаем похожесть для всех товаров
+        similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
+        sorted_idx = similarities.argsort()[::-1][:top_n]
+        result_indices = self.df.index[sorted_idx]
+
+    results = []
+    for idx in result_indices:
+        product = self.df.loc[idx]
+        # Получаем соответствующий score
+        score = similarities[sorted_idx[list(result_indices).index(idx)]]
+        results.append({
+            'name': product['name'],
+            'category': product['category'],
+            'description': product['description'],
+            'price': product['price'],
+            'link': product['link'],
+            'score': score
+        })
+
+    # Фильтруем результаты: убираем товары с score ниже порога
+    results = [r for r in results if r['score'] >= threshold]
+
+    # Если после фильтрации результатов не осталось, возвращаем пустой список и флаг уточнения
+    if not results:
+        return [], True
+
+    # Если максимальный score среди оставшихся товаров >= 0.45, возвращаем только лучший результат
+    max_score = max(r['score'] for r in results)
+    if max_score >= 0.45:
+        results = sorted(results, key=lambda x: x['score'], reverse=True)
+        results = results[:1]
+
+    # Определяем, требуется ли уточнение запроса, если максимум ниже threshold
+    overall_max_score = max(r['score'] for r in results) if results else 0
+    need_clarification = overall_max_score < threshold
+
+    return results, need_clarification
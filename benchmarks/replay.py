@@ -0,0 +1,177 @@
+"""
+Прогон записанных запросов через обработчики бота с подменённым Bot API.
+
+    python -m benchmarks.replay --input queries.jsonl --users 50 --concurrency 16 --output replay.json
+    python -m benchmarks.replay --sessions sessions.csv --repeat 3
+
+Вход — JSONL (обновления Telegram целиком, строки JSON или объекты с полем --field,
+например requests.jsonl) и/или запросы из журнала сессий. Тексты превращаются в сообщения
+от --users пользователей по кругу, поэтому срабатывают и уточняющие вопросы через FSM.
+Обновления проходят через тот же диспетчер, что и в main.py, включая хуки запуска
+и остановки; запросы к Bot API не уходят в сеть, а отвечаются на месте.
+В отчёт попадают перцентили времени обработки обновления, пропускная способность,
+число вызовов Bot API по методам и пиковый RSS.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import time
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, InputFile, Message, Update, User
+
+from batch_search import read_session_queries
+from benchmarks.report import environment, latency_summary, peak_rss_mb, write_report
+
+TEXT_FIELDS = ("text", "query", "title")
+
+
+class MockSession(BaseSession):
+    """Сессия Bot API без сети: send*-методы возвращают сообщение, остальные — True; файлы только читаются."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        # Файлы дочитываются, как при отправке по сети: иначе обработчик, который ждёт конца
+        # отправки файла (например, выгрузка /sessions), и замер не увидят работы по его чтению
+        for _, value in method:
+            if isinstance(value, InputFile):
+                async for _ in value.read(bot):
+                    pass
+        if method.__returning__ is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def read_jsonl(path, field):
+    """Обновления или тексты из JSONL: обновление целиком, строка JSON или объект с текстовым полем."""
+    fields = (field,) + tuple(f for f in TEXT_FIELDS if f != field)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                yield record
+            elif "update_id" in record:
+                yield record
+            else:
+                text = next((record[name] for name in fields if isinstance(record.get(name), str)), None)
+                if text:
+                    yield text
+
+
+def make_update(update_id, user_id, text):
+    user = User(id=user_id, is_bot=False, first_name=f"user{user_id}", username=f"user{user_id}")
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id, date=datetime.datetime.now(), chat=Chat(id=user_id, type="private"),
+        from_user=user, text=text,
+    ))
+
+
+def build_updates(items, users, repeat):
+    updates = []
+    update_ids = itertools.count(1)
+    for _ in range(repeat):
+        for number, item in enumerate(items):
+            if isinstance(item, dict):
+                update = Update.model_validate({**item, "update_id": next(update_ids)})
+            else:
+                update = make_update(next(update_ids), 1000 + number % users, item)
+            updates.append(update)
+    return updates
+
+
+async def replay(updates, concurrency, with_scheduler):
+    from main import create_dispatcher
+    from sender import send_scheduler
+
+    session = MockSession()
+    if with_scheduler:
+        session.middleware(send_scheduler)
+    bot = Bot(token="42:replay", session=session)
+    dp = create_dispatcher()
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+
+    queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+    timings, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            update = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                errors += 1
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await dp.emit_shutdown(bot=bot, **workflow_data)
+    return {
+        "updates": len(updates),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "updates_per_second": len(updates) / elapsed if elapsed else 0.0,
+        "latency": latency_summary(timings),
+        "api_calls": session.calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", action="append", default=[], help="JSONL с обновлениями или запросами")
+    parser.add_argument("--field", default="text", help="поле JSON с текстом запроса")
+    parser.add_argument("--sessions", help="брать запросы (event=query) из журнала сессий")
+    parser.add_argument("--users", type=int, default=50, help="число пользователей, от которых идут запросы")
+    parser.add_argument("--concurrency", type=int, default=16, help="обновлений в обработке одновременно")
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз прогнать вход")
+    parser.add_argument("--with-scheduler", action="store_true",
+                        help="пропускать вызовы Bot API через планировщик отправки с лимитами Telegram")
+    parser.add_argument("--output", help="файл для отчёта JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    items = []
+    for path in args.input:
+        items.extend(read_jsonl(path, args.field))
+    if args.sessions:
+        items.extend(read_session_queries(args.sessions))
+    if not items:
+        parser.error("нет входных запросов: укажите --input или --sessions")
+
+    updates = build_updates(items, args.users, args.repeat)
+    result = asyncio.run(replay(updates, args.concurrency, args.with_scheduler))
+    result["peak_rss_mb"] = peak_rss_mb()
+    write_report({"benchmark": "replay", "environment": environment(), **result}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Общие части отчётов бенчмарков: перцентили задержек, пиковая и текущая память и сведения о сборке."""
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль по уже отсортированному списку (метод ближайшего ранга)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def latency_summary(timings):
+    """Сводка по длительностям в секундах: среднее, p50/p90/p95/p99 и максимум в миллисекундах."""
+    values = sorted(timings)
+    summary = {"count": len(values), "mean_ms": sum(values) / len(values) * 1000 if values else 0.0}
+    for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99)):
+        summary[f"{name}_ms"] = percentile(values, fraction) * 1000
+    summary["max_ms"] = values[-1] * 1000 if values else 0.0
+    return summary
+
+
+def peak_rss_mb():
+    """Пиковый размер резидентной памяти процесса в мегабайтах."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def memory_mb():
+    """
+    Текущая память процесса в мегабайтах: rss, pss (общие страницы делятся между процессами,
+    которые их отображают) и private. Без /proc/self/smaps_rollup (не Linux) — только пиковый rss.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line and not line.startswith(" "))
+    except OSError:
+        return {"rss": peak_rss_mb()}
+
+    def kilobytes(name):
+        return int(fields.get(name, "0 kB").split()[0])
+
+    return {
+        "rss": kilobytes("Rss") / 1024,
+        "pss": kilobytes("Pss") / 1024,
+        "private": (kilobytes("Private_Clean") + kilobytes("Private_Dirty")) / 1024,
+    }
+
+
+def environment():
+    """Коммит и окружение, чтобы отчёты разных сборок можно было сравнивать."""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_report(report, output=None):
+    """Печатает отчёт JSON в stdout или сохраняет в файл output."""
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,62 @@
+"""
+Генерация синтетического каталога товаров в формате dataset.csv.
+
+Словарь строится из слов настоящего dataset.csv и псевдослов из слогов, поэтому
+распределение длины описаний и частот терминов похоже на реальный каталог.
+"""
+import csv
+import itertools
+import random
+
+SYLLABLES = ["ка", "ло", "ми", "ре", "ту", "на", "се", "во", "ди", "па", "ры", "жа", "по", "бе", "ль", "ст"]
+BASE_WORDS = [
+    "кофта", "джемпер", "худи", "свитер", "лонгслив", "футболка", "мяч", "стул", "подарок", "набор",
+    "красная", "синяя", "черная", "белый", "коричневый", "мужская", "женская", "детский", "деревянный",
+    "пластиковый", "дизайнерский", "теплый", "хлопок", "кухня", "спорт", "волейбольный", "баскетбольный",
+]
+COLOURS = ["красная", "синяя", "черная", "белый", "коричневый", "желтый", "оранжевый", "разноцветный"]
+KINDS = ["Мужская кофта", "Женская кофта", "Мяч футбольный", "Мяч баскетбольный", "Стул деревянный", "Стул пластиковый"]
+
+
+def make_vocabulary(size, rng):
+    words = set(BASE_WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def format_price(price):
+    # Цены в dataset.csv записаны с пробелом-разделителем тысяч: "2 541"
+    return f"{price:,}".replace(",", " ")
+
+
+def write_catalog(path, rows, vocabulary_size=20000, seed=0):
+    """Пишет в path каталог из rows товаров с разделителем ";"."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocabulary_size, rng)
+    # Частоты терминов по закону Ципфа, как в текстах на естественном языке
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["id", "name", "description", "category", "price", "link"])
+        for product_id in range(1, rows + 1):
+            name = " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(2, 6)))
+            description = " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(10, 40)))
+            category = f"{rng.choice(KINDS)} {rng.choice(COLOURS)}"
+            price = format_price(rng.randint(100, 20000))
+            link = f"https://www.wildberries.ru/catalog/{product_id}/detail.aspx"
+            writer.writerow([product_id, name, description, category, price, link])
+    return path
+
+
+def make_queries(count, seed=1, vocabulary_size=20000):
+    """Запросы из 1-3 слов, часть с ограничением "до N руб"."""
+    rng = random.Random(seed)
+    vocabulary = BASE_WORDS + make_vocabulary(vocabulary_size, random.Random(0))[:200]
+    queries = []
+    for _ in range(count):
+        query = " ".join(rng.sample(vocabulary, rng.randint(1, 3)))
+        if rng.random() < 0.3:
+            query += f" до {rng.choice([500, 1000, 3000, 10000])} руб"
+        queries.append(query)
+    return queries
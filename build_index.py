@@ -0,0 +1,43 @@
+"""
+Офлайн-сборка поискового индекса.
+
+Строит TF-IDF индекс из CSV и сохраняет его в каталог, откуда бот при старте
+загружает его без разбора CSV и без скачивания стоп-слов. CSV читается потоково
+(см. ingest.py); некорректные строки пропускаются и перечисляются в выводе:
+
+    python build_index.py [--csv dataset.csv] [--out index]
+"""
+import argparse
+import time
+
+from config import DATASET_FILE, INDEX_DIR
+from data import ProductSearch, file_checksum, get_russian_stopwords, validate_index
+from ingest import Catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка предсобранного поискового индекса")
+    parser.add_argument("--csv", default=DATASET_FILE, help="исходный CSV с товарами")
+    parser.add_argument("--out", default=INDEX_DIR, help="каталог для индекса")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    catalog = Catalog(get_russian_stopwords())
+    _, report = catalog.apply(args.csv)
+    if report.delta:
+        parser.error(f"{args.csv} — дельта (есть столбец op), а не полный каталог")
+    search = ProductSearch.from_catalog(catalog, file_checksum(args.csv))
+    validate_index(search)
+    search.save(args.out)
+    print(
+        f"Индекс сохранён в {args.out}: товаров {search.products_count}, "
+        f"терминов {len(search.vectorizer.vocabulary_)}, {time.perf_counter() - started:.2f} с"
+    )
+    if report.bad:
+        print(f"Пропущено строк: {report.bad}")
+        for line, reason in report.bad_rows:
+            print(f"  строка {line}: {reason}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,4 +4,115 @@ import os
 # Загружаем переменные окружения из файла .env
 load_dotenv()
 
-BOT_TOKEN = os.getenv("BOT_TOKEN")
\ No newline at end of file
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+
+# Номер процесса при запуске нескольких воркеров вебхука (см. webhook.py). Воркер 0 пишет
+# в основные файлы журнала и статистики, остальные — в файлы со своим номером
+WORKER_ID = os.getenv("BOT_WORKER_ID", "")
+WORKER_SUFFIX = f"-{WORKER_ID}" if WORKER_ID not in ("", "0") else ""
+
+# Каталог товаров и предсобранный поисковый индекс (см. build_index.py)
+DATASET_FILE = "dataset.csv"
+INDEX_DIR = os.getenv("INDEX_DIR", "index")
+
+# Загрузка каталога (см. ingest.py): строк CSV в одной пачке разбора, сколько некорректных строк
+# показывать в отчёте, как часто уплотнять индекс после дельт (секунды) и при какой доле
+# удалённых товаров уплотнять сразу
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "10000"))
+INGEST_BAD_ROWS_LIMIT = int(os.getenv("INGEST_BAD_ROWS_LIMIT", "20"))
+INGEST_COMPACT_INTERVAL = float(os.getenv("INGEST_COMPACT_INTERVAL", "600"))
+INGEST_COMPACT_RATIO = float(os.getenv("INGEST_COMPACT_RATIO", "0.2"))
+
+# Как часто воркер проверяет, не сохранил ли другой воркер вебхука новую версию индекса в INDEX_DIR
+# (секунды, 0 — не проверять)
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "5"))
+
+# Поиск выполняется в пуле потоков: число потоков, лимит запросов в работе и очереди, таймаут в секундах
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+SEARCH_MAX_PENDING = int(os.getenv("SEARCH_MAX_PENDING", "32"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "5"))
+
+# Бэкенд поиска: exact — точный перебор, inverted — инвертированный индекс с отсечением.
+# ANN_DEPTH ограничивает число постингов на термин (пусто — без ограничения, результат точный)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "exact")
+ANN_DEPTH = int(os.getenv("ANN_DEPTH")) if os.getenv("ANN_DEPTH") else None
+
+# Счётчики популярных товаров держатся в памяти и сбрасываются в CSV раз в POPULAR_FLUSH_INTERVAL секунд.
+# POPULAR_PRODUCTS_BASE — файл воркера 0, по нему находятся файлы остальных воркеров (см. worker_files.py)
+POPULAR_PRODUCTS_BASE = "popular_products.csv"
+POPULAR_PRODUCTS_FILE = f"popular_products{WORKER_SUFFIX}.csv"
+POPULAR_FLUSH_INTERVAL = float(os.getenv("POPULAR_FLUSH_INTERVAL", "30"))
+
+# Журнал сессий: события пишутся пачками из фоновой задачи, файл ротируется по размеру (байты)
+# и возрасту первой записи (секунды, 0 — без ограничения), закрытые сегменты сжимаются gzip.
+# Каждый воркер пишет свой журнал, а /stats и /sessions читают журналы всех воркеров
+SESSIONS_LOG_BASE = "sessions.csv"
+SESSIONS_LOG_FILE = f"sessions{WORKER_SUFFIX}.csv"
+SESSION_LOG_FLUSH_INTERVAL = float(os.getenv("SESSION_LOG_FLUSH_INTERVAL", "1"))
+SESSION_LOG_BATCH_SIZE = int(os.getenv("SESSION_LOG_BATCH_SIZE", "500"))
+SESSION_LOG_MAX_BYTES = int(os.getenv("SESSION_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+SESSION_LOG_MAX_AGE = float(os.getenv("SESSION_LOG_MAX_AGE", str(24 * 60 * 60)))
+SESSION_LOG_GZIP = os.getenv("SESSION_LOG_GZIP", "1") == "1"
+
+# Агрегаты для /stats и /failed_queries: файл сохранения, период обновления по журналам воркеров и сохранения (секунды)
+# и сколько последних необслуженных запросов показывает /failed_queries
+ANALYTICS_CHECKPOINT_FILE = f"sessions_stats{WORKER_SUFFIX}.json"
+ANALYTICS_CHECKPOINT_INTERVAL = float(os.getenv("ANALYTICS_CHECKPOINT_INTERVAL", "60"))
+FAILED_QUERIES_LIMIT = int(os.getenv("FAILED_QUERIES_LIMIT", "50"))
+
+# Предел размера одной части выгрузки /sessions: Telegram принимает от бота документы до 50 МБ
+EXPORT_PART_BYTES = int(os.getenv("EXPORT_PART_BYTES", str(45 * 1024 * 1024)))
+
+# Кэш результатов поиска: максимум записей и время жизни записи в секундах (0 записей — без кэша)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "10000"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+
+# Хранилище состояний FSM: memory — в памяти процесса (по умолчанию), sqlite — общий для процессов
+# файл SQLite; его нужно включить, если вебхук запущен в нескольких процессах (см. webhook.py).
+# Состояния без изменений дольше FSM_TTL секунд считаются брошенными; изменения фиксируются
+# пачками до FSM_BATCH_SIZE штук за FSM_FLUSH_INTERVAL секунд
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+FSM_STORAGE_FILE = os.getenv("FSM_STORAGE_FILE", "fsm.sqlite3")
+FSM_TTL = float(os.getenv("FSM_TTL", str(60 * 60)))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.005"))
+FSM_BATCH_SIZE = int(os.getenv("FSM_BATCH_SIZE", "200"))
+FSM_CLEANUP_INTERVAL = float(os.getenv("FSM_CLEANUP_INTERVAL", "600"))
+
+# Режим вебхука (python webhook.py): адрес и путь приёма, публичный URL для setWebhook,
+# секрет из заголовка X-Telegram-Bot-Api-Secret-Token, число процессов, лимит обновлений
+# в обработке на процесс и сколько секунд дожидаться их завершения при остановке
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "64"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+
+# Отправка сообщений: общий лимит бота и лимит на личный чат (сообщений в секунду), сколько
+# сообщений подряд можно отправить в чат, лимит для групп и сколько раз повторять после RetryAfter
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+# Адрес Bot API (пусто — api.telegram.org); для локальных проверок — benchmarks/fake_bot_api.py
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER")
+
+# Метрики: адрес HTTP-сервера /metrics (по умолчанию порт 0 — без сервера; у воркеров вебхука порт
+# сдвигается на номер воркера), сколько последних значений хранится для перцентилей /latency и как часто
+# измерять задержку event loop (секунды)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+if METRICS_PORT and WORKER_ID:
+    METRICS_PORT += int(WORKER_ID)
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1000"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+# Сэмплирующий профилировщик (/profile): включается явно, снимает стеки раз в PROFILER_INTERVAL
+# секунд, один прогон не дольше PROFILER_MAX_SECONDS
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
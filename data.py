@@ -1,101 +1,301 @@
-import pandas as pd
+import copy
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import nltk
-from nltk.corpus import stopwords
-import re
-import ssl
-ssl._create_default_https_context = ssl._create_unverified_context
 
-nltk.download('stopwords', quiet=True)
-russian_stopwords = stopwords.words("russian")
+from config import ANN_DEPTH, SEARCH_BACKEND
+from metrics import STAGE_SECONDS
+from ingest import Catalog
+from product_store import ProductStore
+from query_parser import FilterIndex, ProductLabels
+from retrieval import make_backend
+
+# Версия формата предсобранного индекса: при несовместимых изменениях увеличиваем
+INDEX_FORMAT_VERSION = 3
+
+_russian_stopwords = None
+
+
+def get_russian_stopwords():
+    """Возвращает русские стоп-слова NLTK, скачивая корпус только если его нет локально."""
+    global _russian_stopwords
+    if _russian_stopwords is None:
+        import nltk
+        from nltk.corpus import stopwords
+        try:
+            _russian_stopwords = stopwords.words("russian")
+        except LookupError:
+            if not nltk.download('stopwords', quiet=True):
+                # Повтор без проверки сертификата (например, за прокси с подменой сертификатов).
+                # Настройка ssl общая для процесса, поэтому возвращаем её сразу после загрузки
+                import ssl
+                default_context = ssl._create_default_https_context
+                ssl._create_default_https_context = ssl._create_unverified_context
+                try:
+                    nltk.download('stopwords', quiet=True)
+                finally:
+                    ssl._create_default_https_context = default_context
+            _russian_stopwords = stopwords.words("russian")
+    return _russian_stopwords
+
+
+def file_checksum(path):
+    """Считает sha256 файла, не загружая его в память целиком."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IndexStaleError(ValueError):
+    """Предсобранный индекс отсутствует, повреждён или собран из другого CSV."""
+
+
+class IndexValidationError(ValueError):
+    """Новый индекс не прошёл проверку и не может заменить текущий."""
+
+
+def read_index_meta(index_dir, csv_file=None):
+    """Метаданные сохранённого индекса; IndexStaleError, если его нельзя использовать для csv_file."""
+    try:
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as e:
+        raise IndexStaleError(f"не удалось прочитать {index_dir}: {e}") from e
+    if meta.get("format_version") != INDEX_FORMAT_VERSION:
+        raise IndexStaleError(f"формат индекса {meta.get('format_version')} не поддерживается")
+    if csv_file is not None and meta["source_checksum"] != file_checksum(csv_file):
+        raise IndexStaleError(f"индекс {index_dir} собран не из текущего {csv_file}")
+    return meta
+
+
+def ensure_index(csv_file, index_dir):
+    """
+    Собирает и сохраняет индекс из csv_file, если в index_dir нет свежего.
+    Вызывается до запуска воркеров вебхука: они загружают один и тот же индекс через mmap
+    и делят его страницы, а не собирают каждый свою копию.
+    """
+    try:
+        read_index_meta(index_dir, csv_file)
+    except IndexStaleError:
+        ProductSearch(csv_file).save(index_dir)
 
 
 class ProductSearch:
-    def __init__(self, csv_file):
-        # Читаем CSV с разделителем ";"
-        self.df = pd.read_csv(csv_file, sep=';')
-        # Предварительная очистка столбца с ценами: удаляем пробелы и заменяем запятые на точки
-        self.df['price'] = self.df['price'].astype(str).str.replace(r'\s+', '', regex=True)
-        self.df['price'] = self.df['price'].str.replace(',', '.')
-        # Преобразуем цену к числовому значению, некорректные значения становятся NaN
-        self.df['price'] = pd.to_numeric(self.df['price'], errors='coerce')
-        # Удаляем записи с отсутствующей ценой
-        self.df = self.df[self.df['price'].notnull()]
-
-        # Объединяем название, описание и категорию для поиска
-        self.df['text'] = (
-            self.df['name'].fillna('') + " " +
-            self.df['description'].fillna('') + " " +
-            self.df['category'].fillna('')
+    """
+    Одна версия поискового индекса: товары (ProductStore), TF-IDF матрица, бэкенд поиска и фильтры.
+
+    Версия не меняется после сборки. Каталог загружается потоково (см. ingest.py), а дельты
+    собирают следующую версию из Catalog, переиспользуя всё, что не затронуто изменением.
+    Товары, удалённые дельтой, до уплотнения остаются на своих позициях: live[position] == False.
+    """
+
+    def __init__(self, csv_file, backend=SEARCH_BACKEND):
+        catalog = Catalog(get_russian_stopwords())
+        catalog.apply(csv_file)
+        self._from_catalog(catalog, file_checksum(csv_file), backend)
+
+    @classmethod
+    def from_catalog(cls, catalog, source_checksum, backend=SEARCH_BACKEND, previous=None, changed=None):
+        """
+        Версия индекса по текущему состоянию catalog. Если передана предыдущая версия
+        и позиции изменённых товаров, бэкенд обновляется инкрементально, а не строится заново.
+        """
+        self = cls.__new__(cls)
+        self._from_catalog(catalog, source_checksum, backend, previous, changed)
+        return self
+
+    def _from_catalog(self, catalog, source_checksum, backend, previous=None, changed=None):
+        # Номер версии индекса назначает IndexManager при подмене
+        self.version = 0
+        self.backend_name = backend
+        self.source_checksum = source_checksum
+        self.compacted = not catalog.dirty
+        self.products = catalog.products
+        self.live = None if catalog.live.all() else catalog.live
+        # Словарь и IDF фиксированы, поэтому векторизатор не нужно обучать
+        self.vectorizer = TfidfVectorizer(stop_words=catalog.stop_words, vocabulary=dict(catalog.vocabulary))
+        self.vectorizer.idf_ = catalog.idf
+        self.counts = catalog.counts
+        self.tfidf_matrix = catalog.tfidf
+        filters = FilterIndex(catalog.labels, self.products.category_ids, catalog.attribute_positions,
+                              catalog.attribute_ids, self.products.prices, self.live)
+        engine = None
+        if previous is not None and changed is not None and previous.backend_name == backend:
+            # Копия бэкенда предыдущей версии: её запросы продолжают работать со старыми постингами
+            engine = copy.copy(previous.backend)
+            engine.update(self.tfidf_matrix, changed)
+        self._prepare(filters, engine)
+
+    @property
+    def products_count(self):
+        """Число товаров без удалённых дельтами."""
+        return len(self.products) if self.live is None else int(self.live.sum())
+
+    def save(self, index_dir):
+        """
+        Сохраняет словарь, IDF, массивы CSR-матриц, метки фильтров и данные товаров в index_dir.
+        Каталог подменяется целиком, поэтому читатель никогда не увидит его наполовину записанным.
+        """
+        temp_dir = f"{index_dir}.tmp"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+
+        def save_array(name, array):
+            np.save(os.path.join(temp_dir, f"{name}.npy"), array)
+
+        matrix = self.tfidf_matrix.tocsr()
+        save_array("idf", self.vectorizer.idf_)
+        save_array("data", matrix.data)
+        save_array("indices", matrix.indices)
+        save_array("indptr", matrix.indptr)
+        # У матрицы частот та же структура, что у TF-IDF: сохраняем только значения
+        save_array("counts", self.counts.data)
+        save_array("live", np.ones(len(self.products), dtype=bool) if self.live is None else self.live)
+        save_array("attribute_positions", self.filters.attribute_positions)
+        save_array("attribute_ids", self.filters.attribute_ids)
+        # Строки, цены и категории товаров (strings, offsets, prices, category_ids, categories.json)
+        self.products.save(temp_dir)
+
+        # Словарь сохраняем списком терминов в порядке номеров столбцов матрицы
+        terms = [None] * len(self.vectorizer.vocabulary_)
+        for term, column in self.vectorizer.vocabulary_.items():
+            terms[column] = term
+        meta = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "source_checksum": self.source_checksum,
+            "compacted": self.compacted,
+            "shape": list(matrix.shape),
+            "vocabulary": terms,
+            "stop_words": list(self.vectorizer.stop_words or []),
+            "attributes": [list(key) for key in self.filters.attribute_keys],
+        }
+        # meta.json пишем последним: без него каталог не считается индексом
+        with open(os.path.join(temp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        old_dir = f"{index_dir}.old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(index_dir):
+            os.rename(index_dir, old_dir)
+        os.rename(temp_dir, index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, index_dir, csv_file=None, backend=SEARCH_BACKEND):
+        """
+        Загружает индекс, сохранённый методом save, отображая массивы в память.
+        Страницы отображённых файлов общие для всех процессов, загрузивших один индекс
+        (воркеры вебхука), поэтому товары и матрицы не копируются в каждый процесс.
+        Если передан csv_file, проверяет, что индекс собран именно из него.
+        """
+        meta = read_index_meta(index_dir, csv_file)
+
+        def load_array(name):
+            return np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+
+        self = cls.__new__(cls)
+        self.version = 0
+        self.backend_name = backend
+        self.source_checksum = meta["source_checksum"]
+        self.compacted = meta["compacted"]
+        self.products = ProductStore.load(index_dir)
+        live = load_array("live")
+        self.live = None if live.all() else live
+
+        # Словарь и IDF фиксированы, поэтому векторизатор не нужно обучать заново
+        self.vectorizer = TfidfVectorizer(
+            stop_words=meta["stop_words"] or None,
+            vocabulary={term: column for column, term in enumerate(meta["vocabulary"])},
         )
-        # Создаем TF-IDF матрицу с использованием русского списка стоп-слов
-        self.vectorizer = TfidfVectorizer(stop_words=russian_stopwords)
-        self.tfidf_matrix = self.vectorizer.fit_transform(self.df['text'])
+        self.vectorizer.idf_ = load_array("idf")
+        shape = tuple(meta["shape"])
+        indices, indptr = load_array("indices"), load_array("indptr")
+        self.tfidf_matrix = sparse.csr_matrix((load_array("data"), indices, indptr), shape=shape)
+        self.counts = sparse.csr_matrix((load_array("counts"), indices, indptr), shape=shape)
+        labels = ProductLabels.from_lists(self.products.category_names, [tuple(key) for key in meta["attributes"]])
+        filters = FilterIndex(labels, self.products.category_ids, load_array("attribute_positions"),
+                              load_array("attribute_ids"), self.products.prices, self.live)
+        self._prepare(filters)
+        return self
 
-    def search(self, query, threshold=0.2, top_n=3):
-        # Ищем шаблон "до <число> рублей" в запросе
-        price_limit = None
-        price_pattern = re.compile(r'до\s*(\d+)\s*руб', re.IGNORECASE)
-        price_match = price_pattern.search(query)
-        if price_match:
-            price_limit = float(price_match.group(1))
-            # Удаляем часть запроса с фильтром цены, чтобы она не влияла на поиск по тексту
-            query = price_pattern.sub('', query).strip()
+    def _prepare(self, filters, backend=None):
+        """Готовит бэкенд поиска и индексы фильтров."""
+        self.backend = backend if backend is not None else make_backend(
+            self.backend_name, self.tfidf_matrix, depth=ANN_DEPTH)
+        # Индексы фильтров по цене, категориям и атрибутам (см. query_parser.py)
+        self.filters = filters
 
-        # Преобразуем запрос в вектор
-        query_vec = self.vectorizer.transform([query])
-
-        # Если указано ограничение по цене, сначала фильтруем товары
-        if price_limit is not None:
-            price_mask = self.df['price'].notnull() & (self.df['price'] < price_limit)
-            if not price_mask.any():
-                # Если нет товаров с подходящей ценой, возвращаем пустой список
-                return [], True
-            filtered_indices = self.df.index[price_mask]
-            # Вычисляем похожесть только для отфильтрованных товаров
-            similarities = cosine_similarity(query_vec, self.tfidf_matrix[filtered_indices]).flatten()
-            sorted_idx = similarities.argsort()[::-1][:top_n]
-            result_indices = filtered_indices[sorted_idx]
-        else:
-            # Если ограничения по цене нет, считаем похожесть для всех товаров
-            similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
-            sorted_idx = similarities.argsort()[::-1][:top_n]
-            result_indices = self.df.index[sorted_idx]
+    def product(self, position):
+        """Товар по позиции в индексе; id — его номер в текущей версии индекса."""
+        products = self.products
+        return {
+            'id': int(position),
+            'name': products.get(position, 'name'),
+            'category': products.category(position),
+            'description': products.get(position, 'description'),
+            'price': products.price(position),
+            'link': products.get(position, 'link'),
+        }
 
+    def _rank(self, top, threshold):
+        """Собирает выдачу из top-k бэкенда, применяет порог и правило единственного лучшего результата."""
         results = []
-        for idx in result_indices:
-            product = self.df.loc[idx]
-            # Получаем соответствующий score
-            score = similarities[sorted_idx[list(result_indices).index(idx)]]
-            results.append({
-                'name': product['name'],
-                'category': product['category'],
-                'description': product['description'],
-                'price': product['price'],
-                'link': product['link'],
-                'score': score
-            })
-
-        # Фильтруем результаты: убираем товары с score ниже порога
-        results = [r for r in results if r['score'] >= threshold]
+        for position, score in zip(*top):
+            # Фильтруем результаты: убираем товары с score ниже порога
+            if score < threshold:
+                break
+            product = self.product(position)
+            product['score'] = score
+            results.append(product)
 
         # Если после фильтрации результатов не осталось, возвращаем пустой список и флаг уточнения
         if not results:
             return [], True
 
-        # Если максимальный score среди оставшихся товаров >= 0.45, возвращаем только лучший результат
-        max_score = max(r['score'] for r in results)
-        if max_score >= 0.45:
-            results = sorted(results, key=lambda x: x['score'], reverse=True)
+        # Результаты отсортированы по убыванию score: если лучший >= 0.45, возвращаем только его
+        if results[0]['score'] >= 0.45:
             results = results[:1]
 
-        # Определяем, требуется ли уточнение запроса, если максимум ниже threshold
-        overall_max_score = max(r['score'] for r in results) if results else 0
-        need_clarification = overall_max_score < threshold
+        return results, False
+
+    def search(self, query, threshold=0.2, top_n=3):
+        with STAGE_SECONDS.time("parse"):
+            parsed = self.filters.parse(query)
+        with STAGE_SECONDS.time("filter"):
+            candidates = self.filters.candidates(parsed)
+        # Преобразуем запрос в вектор
+        with STAGE_SECONDS.time("vectorize"):
+            query_vec = self.vectorizer.transform([parsed.text])
+        with STAGE_SECONDS.time("score"):
+            top = self.backend.top_k(query_vec, top_n, candidates)
+        with STAGE_SECONDS.time("assemble"):
+            return self._rank(top, threshold)
 
-        return results, need_clarification
+    def search_batch(self, queries, threshold=0.2, top_n=3):
+        """
+        Выполняет search для списка запросов: все запросы векторизуются одним вызовом transform
+        и оцениваются бэкендом пачкой (точный бэкенд — одним произведением разреженных матриц).
+        Возвращает список пар (results, need_clarification) в порядке запросов.
+        """
+        parsed = [self.filters.parse(query) for query in queries]
+        if not parsed:
+            return []
+        query_matrix = self.vectorizer.transform([p.text for p in parsed])
+        candidates_list = [self.filters.candidates(p) for p in parsed]
+        return [self._rank(top, threshold) for top in self.backend.top_k_batch(query_matrix, top_n, candidates_list)]
 
 
-# Создаем экземпляр поиска товаров (файл dataset.csv должен находиться в корне проекта)
-product_search_instance = ProductSearch("dataset.csv")
+def validate_index(search: ProductSearch):
+    """Проверяет, что собранный индекс пригоден для обслуживания запросов."""
+    if search.products_count == 0:
+        raise IndexValidationError("в датасете нет ни одного товара с корректной ценой")
+    if search.tfidf_matrix.shape[0] != len(search.products):
+        raise IndexValidationError("размер TF-IDF матрицы не совпадает с числом товаров")
+    # Пробный запрос по названию первого товара должен отработать без ошибок
+    search.search(search.products.get(0, "name"))
@@ -1,86 +1,39 @@
+import asyncio
+import html
+import logging
 import os
-import csv
 import random
-import datetime
+import tempfile
 from aiogram import Router, types, F
-from aiogram.filters import CommandStart, Command
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InputFile, FSInputFile, KeyboardButton, ReplyKeyboardMarkup
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import BufferedInputFile, InputFile, FSInputFile, KeyboardButton, ReplyKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.utils.formatting import Text
 
-from data import product_search_instance
+from analytics import session_aggregates
+from config import DATASET_FILE
+from index_manager import index_manager
+from ingest import is_delta_feed
+from metrics import LOOP_LAG_SECONDS, STAGE_SECONDS, TELEGRAM_SECONDS, UPDATE_SECONDS, profiler
+from popularity import popularity_store
+from search_executor import search_executor, SearchUnavailableError
+from sender import answer_products
+from session_export import SessionExport, ExportFilterError, parse_export_filters
+from session_log import other_worker_logs, session_log, worker_logs
 
 router = Router()
+logger = logging.getLogger(__name__)
 
-# Пути к файлам логирования сессий, популярности товаров и dataset
-SESSIONS_LOG_FILE = "sessions.csv"
-POPULAR_PRODUCTS_FILE = "popular_products.csv"
-DATASET_FILE = "dataset.csv"
-
-# Инициализация CSV-файлов (если не существуют)
-if not os.path.exists(SESSIONS_LOG_FILE):
-    with open(SESSIONS_LOG_FILE, mode="w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "user_id", "username", "event", "text"])
+def log_session(user: types.User, event: str, text: str):
+    """Ставит событие сессии в очередь на запись в журнал."""
+    session_log.write(user.id, user.username or "", event, text)
 
-if not os.path.exists(POPULAR_PRODUCTS_FILE):
-    with open(POPULAR_PRODUCTS_FILE, mode="w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        # Сохраняем: name, category, description, price, link, count
-        writer.writerow(["name", "category", "description", "price", "link", "count"])
+# Приглашение продолжить поиск под карточками найденных товаров
+FOLLOW_UP_TEXT = "Если ещё что-то ищите, напишите 👇"
 
-def log_session(user: types.User, event: str, text: str):
-    """Записывает событие сессии в CSV-файл."""
-    timestamp = datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
-    with open(SESSIONS_LOG_FILE, mode="a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([timestamp, user.id, user.username or "", event, text])
-
-def update_popular_product(product: dict):
-    """Обновляет или добавляет запись о товаре в файле популярности."""
-    # Считываем текущие данные
-    rows = []
-    found = False
-    if os.path.exists(POPULAR_PRODUCTS_FILE):
-        with open(POPULAR_PRODUCTS_FILE, mode="r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Сравнение по уникальному идентификатору товара можно сделать по name и link
-                if row["name"] == product["name"] and row["link"] == product["link"]:
-                    row["count"] = str(int(row["count"]) + 1)
-                    found = True
-                rows.append(row)
-    # Если не найден, добавляем новую запись
-    if not found:
-        rows.append({
-            "name": product["name"],
-            "category": product["category"],
-            "description": product["description"],
-            "price": product["price"],
-            "link": product["link"],
-            "count": "1"
-        })
-    # Записываем обновлённые данные
-    with open(POPULAR_PRODUCTS_FILE, mode="w", newline="", encoding="utf-8") as f:
-        fieldnames = ["name", "category", "description", "price", "link", "count"]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
-
-def get_top_popular_products(top_n=3):
-    """Возвращает список топовых популярных товаров."""
-    products = []
-    if os.path.exists(POPULAR_PRODUCTS_FILE):
-        with open(POPULAR_PRODUCTS_FILE, mode="r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Преобразуем счётчик в число
-                row["count"] = int(row["count"])
-                products.append(row)
-    # Сортируем по убыванию count
-    products = sorted(products, key=lambda x: x["count"], reverse=True)
-    return products[:top_n]
+# Ответ, когда поиск не уложился в таймаут из-за нагрузки
+BUSY_TEXT = "Сейчас слишком много запросов, попробуйте, пожалуйста, ещё раз через несколько секунд."
 
 class QueryState(StatesGroup):
     waiting_for_clarification = State()
@@ -88,6 +41,9 @@ class QueryState(StatesGroup):
 class DatasetState(StatesGroup):
     waiting_for_dataset = State()
 
+# Полный каталог или дельта: тип файла определяется по столбцу op
+DATASET_UPLOAD_NAMES = ("dataset.csv", "dataset_delta.csv")
+
 @router.message(CommandStart())
 async def start_command(message: types.Message, state: FSMContext):
     await state.clear()
@@ -102,11 +58,15 @@ async def info_handler(message: types.Message):
     info_text = (
         "<u><b>Доступные команды:</b></u>\n\n"
         "<b>/start</b> - Запускает сессию, приветствует пользователя и предлагает выбрать между популярными и скидочными товарами.\n"
-        "<b>/sessions</b> - Отправляет файл с логами сессий пользователей.\n"
+        "<b>/sessions</b> - Отправляет сжатый файл с логами сессий пользователей. Можно отфильтровать: <i>from=ГГГГ-ММ-ДД to=ГГГГ-ММ-ДД user=id</i>.\n"
         "<b>/stats</b> - Выводит агрегированную статистику по сессиям (запуски, запросы, уточнения, отправленные рекомендации).\n"
         "<b>/failed_queries</b> - Показывает список запросов, по которым не были отправлены рекомендации.\n"
+        "<b>/cache_stats</b> - Показывает попадания в кэш поиска и занимаемую им память.\n"
+        "<b>/latency</b> - Показывает p50/p95/p99 времени этапов обработки за последние запросы.\n"
+        "<b>/profile</b> - Снимает профиль процесса за <i>N</i> секунд (если профилировщик включён).\n"
         "<b>/get_dataset</b> - Отправляет файл <i>dataset.csv</i> с данными товаров.\n"
-        "<b>/update_dataset</b> - Позволяет обновить файл <i>dataset.csv</i> (бот перейдёт в режим ожидания файла).\n\n"
+        "<b>/update_dataset</b> - Позволяет обновить файл <i>dataset.csv</i> (бот перейдёт в режим ожидания файла). "
+        "Файл <i>dataset_delta.csv</i> со столбцом <i>op</i> (add, update, remove) меняет только указанные по <i>id</i> товары.\n\n"
         "<u><b>Также доступны кнопки:</b></u>\n\n"
         "<b>Популярные товары</b> - Показывает топ популярных товаров, основанный на количестве запросов.\n"
         "<b>Скидочные товары</b> - Отправляет товары со скидкой."
@@ -114,29 +74,26 @@ async def info_handler(message: types.Message):
     await message.answer(info_text, parse_mode="HTML")
 
 @router.message(Command("sessions"))
-async def sessions_handler(message: types.Message):
-    if not os.path.exists(SESSIONS_LOG_FILE):
-        await message.answer("Данных о сессиях пока нет.")
+async def sessions_handler(message: types.Message, command: CommandObject):
+    try:
+        filters = parse_export_filters(command.args)
+    except ExportFilterError as e:
+        await message.answer(f"Не удалось разобрать фильтры: {e}. Пример: /sessions from=2024-01-01 to=2024-01-31 user=123")
         return
 
-    with open(SESSIONS_LOG_FILE, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-
-    if not rows:
+    await session_log.flush()
+    export = SessionExport(worker_logs(), **filters)
+    if not await export.has_rows():
         await message.answer("Данных о сессиях пока нет.")
         return
 
-    table_lines = []
-    for row in rows:
-        table_lines.append("\t".join(row))
-    table_text = "\n".join(table_lines)
-
-    temp_filename = "sessions_export.txt"
-    with open(temp_filename, "w", encoding="utf-8") as f:
-        f.write(table_text)
-    await message.answer_document(FSInputFile(temp_filename))
-    os.remove(temp_filename)
+    # Журнал сжимается по частям во временные файлы; большая выгрузка уходит несколькими файлами
+    while not export.exhausted:
+        part = await export.next_part()
+        try:
+            await message.answer_document(part)
+        finally:
+            os.remove(part.path)
 
 # Команда для отображения агрегированной статистики
 @router.message(Command("stats"))
@@ -145,16 +102,9 @@ async def stats_handler(message: types.Message):
     Команда для менеджера: выводит агрегированную статистику по запросам и рекомендациям.
     Рекомендациями, не приведшими к покупке, считаются случаи, когда по запросу не было отправлено результатов.
     """
-    if not os.path.exists(SESSIONS_LOG_FILE):
-        await message.answer("Нет данных для статистики.")
-        return
-
-    event_counts = {}
-    with open(SESSIONS_LOG_FILE, mode="r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            event = row["event"]
-            event_counts[event] = event_counts.get(event, 0) + 1
+    # События этого процесса учтены при записи; журналы остальных воркеров дочитываются с диска
+    await session_aggregates.refresh(other_worker_logs())
+    event_counts = session_aggregates.event_counts
 
     query_count = event_counts.get("query", 0)
     result_sent_count = event_counts.get("result_sent", 0)
@@ -176,56 +126,79 @@ async def failed_queries_handler(message: types.Message):
     Команда для менеджера: выводит список конкретных запросов,
     по которым не были отправлены рекомендации (нет события result_sent после запроса).
     """
-    if not os.path.exists(SESSIONS_LOG_FILE):
-        await message.answer("Нет данных для анализа.")
-        return
-
-    # Читаем логи и группируем события по пользователям
-    user_events = {}
-    with open(SESSIONS_LOG_FILE, mode="r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            user_id = row["user_id"]
-            try:
-                ts = datetime.datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                continue
-            row["timestamp_dt"] = ts
-            user_events.setdefault(user_id, []).append(row)
-
-    non_conversion_queries = []
-    for user_id, events in user_events.items():
-        events = sorted(events, key=lambda r: r["timestamp_dt"])
-        i = 0
-        while i < len(events):
-            event = events[i]
-            if event["event"] == "query":
-                query_event = event
-                j = i + 1
-                conversion_found = False
-                while j < len(events) and events[j]["event"] != "query":
-                    if events[j]["event"] == "result_sent":
-                        conversion_found = True
-                        break
-                    j += 1
-                if not conversion_found:
-                    non_conversion_queries.append(query_event)
-            i += 1
+    # Дочитываются только события, записанные другими воркерами после прошлого обновления агрегатов
+    await session_aggregates.refresh(other_worker_logs())
+    non_conversion_queries, total = session_aggregates.failed_queries()
 
     if not non_conversion_queries:
         await message.answer("Все запросы привели к отправке рекомендаций.")
         return
 
     lines = ["<b>Запросы без отправленных рекомендаций:</b>"]
-    for q in non_conversion_queries:
-        timestamp = q["timestamp"]
-        user_id = q["user_id"]
-        username = q["username"] if q["username"] else "N/A"
-        query_text = q["text"]
+    if total > len(non_conversion_queries):
+        lines.append(f"<i>Показаны последние {len(non_conversion_queries)} из {total}</i>")
+    for timestamp, user_id, username, query_text in non_conversion_queries:
+        username = username if username else "N/A"
         lines.append(f"{timestamp} | User: {user_id} ({username}) | Запрос: {query_text}")
 
     await message.answer("\n".join(lines), parse_mode="HTML")
 
+# Команда для просмотра состояния кэша результатов поиска
+@router.message(Command("cache_stats"))
+async def cache_stats_handler(message: types.Message):
+    stats = search_executor.cache.stats()
+    lines = [
+        "<b>Кэш поиска:</b>",
+        f"<b>Версия индекса:</b> {index_manager.version}",
+        f"<b>Записей:</b> {stats['entries']} из {stats['max_entries']}",
+        f"<b>Попадания:</b> {stats['hits']}",
+        f"<b>Промахи:</b> {stats['misses']}",
+        f"<b>Доля попаданий:</b> {stats['hit_rate']:.1%}",
+        f"<b>Память:</b> {stats['bytes'] / 1024 / 1024:.2f} МБ",
+    ]
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+# Команда для просмотра задержек по этапам обработки
+@router.message(Command("latency"))
+async def latency_handler(message: types.Message):
+    sections = [
+        ("Обработка обновления", UPDATE_SECONDS),
+        ("Этапы", STAGE_SECONDS),
+        ("Запросы к Telegram", TELEGRAM_SECONDS),
+        ("Задержка event loop", LOOP_LAG_SECONDS),
+    ]
+    lines = ["<b>Задержки, мс (p50 / p95 / p99, по последним значениям):</b>"]
+    for title, histogram in sections:
+        percentiles = histogram.percentiles()
+        if not percentiles:
+            continue
+        lines.append(f"\n<b>{title}:</b>")
+        for label, (count, values) in sorted(percentiles.items()):
+            formatted = " / ".join(f"{value * 1000:.2f}" for value in values)
+            lines.append(f"{label or 'всего'}: {formatted} (n={count})")
+    if len(lines) == 1:
+        lines.append("Данных пока нет.")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+# Команда для снятия профиля: стеки в свёрнутом формате для flamegraph
+@router.message(Command("profile"))
+async def profile_handler(message: types.Message, command: CommandObject):
+    if profiler is None:
+        await message.answer("Профилировщик выключен (PROFILER_ENABLED=1).")
+        return
+    try:
+        seconds = float(command.args) if command.args else 10.0
+    except ValueError:
+        await message.answer("Укажите длительность в секундах, например: /profile 10")
+        return
+    await message.answer(f"Снимаю профиль {seconds:g} с...")
+    try:
+        stacks = await profiler.profile(seconds)
+    except RuntimeError as e:
+        await message.answer(f"Не удалось снять профиль: {e}")
+        return
+    await message.answer_document(BufferedInputFile(stacks.encode("utf-8"), filename="profile.folded"))
+
 # Команда для получения файла dataset.csv
 @router.message(Command("get_dataset"))
 async def get_dataset_handler(message: types.Message):
@@ -238,67 +211,86 @@ async def get_dataset_handler(message: types.Message):
 @router.message(Command("update_dataset"))
 async def update_dataset_command(message: types.Message, state: FSMContext):
     await state.set_state(DatasetState.waiting_for_dataset)
-    await message.answer("Пришлите, пожалуйста, новый файл dataset.csv.")
+    await message.answer("Пришлите, пожалуйста, новый файл dataset.csv или дельту dataset_delta.csv.")
+
+def format_ingest_report(report):
+    """Сводка загрузки каталога: операции дельты и первые пропущенные строки."""
+    lines = []
+    if report.delta:
+        lines.append(f"<b>Добавлено:</b> {report.added}, <b>изменено:</b> {report.updated}, "
+                     f"<b>удалено:</b> {report.removed}")
+    if report.bad:
+        lines.append(f"<b>Пропущено строк:</b> {report.bad}")
+        lines.extend(f"строка {line}: {html.escape(reason)}" for line, reason in report.bad_rows)
+    return "\n".join(lines)
 
 # Обработчик получения файла для обновления dataset.csv
 @router.message(DatasetState.waiting_for_dataset)
 async def update_dataset_handler(message: types.Message, state: FSMContext):
-    if not message.document:
-        await message.answer("Пожалуйста, отправьте файл с именем dataset.csv.")
+    if not message.document or message.document.file_name not in DATASET_UPLOAD_NAMES:
+        await message.answer("Пожалуйста, отправьте файл с именем dataset.csv или dataset_delta.csv.")
         return
     document = message.document
-    if document.file_name != "dataset.csv":
-        await message.answer("Пожалуйста, отправьте файл с именем dataset.csv.")
+    # Скачиваем во временный файл с уникальным именем: одновременные загрузки не мешают друг другу,
+    # а текущий dataset.csv заменяется только после проверки нового индекса
+    fd, temp_filename = tempfile.mkstemp(prefix=f"{os.path.basename(DATASET_FILE)}.", suffix=".new",
+                                         dir=os.path.dirname(os.path.abspath(DATASET_FILE)))
+    os.close(fd)
+    try:
+        await message.bot.download(document.file_id, destination=temp_filename)
+        delta = await asyncio.to_thread(is_delta_feed, temp_filename)
+        if delta:
+            await message.answer("Дельта получена, обновляю поисковый индекс...")
+            # dataset.csv с применённой дельтой записывает сам менеджер индекса
+            report = await index_manager.apply_delta(temp_filename)
+        else:
+            await message.answer("Файл получен, перестраиваю поисковый индекс...")
+            report = await index_manager.rebuild(temp_filename)
+            os.replace(temp_filename, DATASET_FILE)
+    except (ValueError, KeyError) as e:
+        await message.answer(f"Не удалось обновить индекс, продолжаю работать на текущей версии "
+                             f"{index_manager.version}: {html.escape(str(e))}")
+        return
+    except Exception as e:
+        logger.exception("Не удалось обновить dataset.csv из %s", document.file_name)
+        await message.answer(f"Не удалось обновить индекс из-за внутренней ошибки ({html.escape(type(e).__name__)}), "
+                             f"продолжаю работать на текущей версии {index_manager.version}.")
         return
-    await message.bot.download(document.file_id, destination=DATASET_FILE)
-    await message.answer("Файл dataset.csv успешно обновлен.")
+    finally:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+    details = format_ingest_report(report.ingest)
+    await message.answer(
+        "Файл dataset.csv успешно обновлен.\n"
+        f"<b>Версия индекса:</b> {report.version}\n"
+        f"<b>Товаров:</b> {report.products}\n"
+        f"<b>Время перестроения:</b> {report.duration:.2f} с"
+        + (f"\n{details}" if details else ""),
+        parse_mode="HTML"
+    )
+    # Режим ожидания файла снимается только после успешного обновления: при ошибке можно сразу прислать другой файл
     await state.clear()
 
 # Обработчик для отображения популярных товаров по нажатию кнопки
 @router.message(F.text == "Популярные товары")
 async def popular_products_handler(message: types.Message):
-    top_products = get_top_popular_products()
+    top_products = popularity_store.top()
     if not top_products:
         await message.answer("Популярных товаров пока нет.")
         return
 
-    for product in top_products:
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="Перейти", url=product['link'])]
-        ])
-        text = (
-            f"<b>{product['name']}</b>\n\n"
-            f"<b>Категория:</b> {product['category']}\n\n"
-            f"{product['description']}\n\n"
-            f"<b>Цена:</b> {product['price']} руб.\n"
-            f"<b>Количество запросов:</b> {product['count']}"
-        )
-        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+    # Все карточки уходят одним сообщением с кнопкой на каждый товар
+    cards = index_manager.cards
+    await answer_products(message, [cards.popular(product) for product in top_products])
 
 @router.message(F.text == "Скидочные товары")
 async def discounted_products_handler(message: types.Message):
-    df = product_search_instance.df  # датафрейм, загруженный при инициализации ProductSearch
-    if df.empty:
+    # Случайные 3 товара (или меньше, если товаров меньше 3) со случайной скидкой от 10% до 30%
+    cards = index_manager.cards.discounted(3)
+    if not cards:
         await message.answer("Нет товаров в dataset.")
         return
-    # Выбираем случайные 3 товара (или меньше, если товаров меньше 3)
-    sample_products = df.sample(n=min(3, len(df)))
-    for index, product in sample_products.iterrows():
-        original_price = product['price']
-        discount_percent = random.randint(10, 30)  # случайная скидка от 10% до 30%
-        discounted_price = round(original_price * (1 - discount_percent / 100), 2)
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="Перейти", url=product['link'])]
-        ])
-        text = (
-            f"<b>{product['name']}</b>\n\n"
-            f"<b>Категория:</b> {product['category']}\n\n"
-            f"{product['description']}\n\n"
-            f"<b>Старая цена:</b> {original_price} руб.\n"
-            f"<b>Скидка:</b> {discount_percent}%\n"
-            f"<b>Новая цена:</b> {discounted_price} руб."
-        )
-        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+    await answer_products(message, cards)
 
 @router.message(QueryState.waiting_for_clarification)
 async def clarification_handler(message: types.Message, state: FSMContext):
@@ -316,7 +308,11 @@ async def clarification_handler(message: types.Message, state: FSMContext):
     await state.update_data(accumulated_clarification=new_accumulated)
     log_session(message.from_user, "clarification", f"Original: {original_query} | New: {new_input}")
 
-    results, need_clarification = product_search_instance.search(combined_query)
+    try:
+        results, need_clarification = await search_executor.search(index_manager.current, combined_query)
+    except SearchUnavailableError:
+        await message.answer(BUSY_TEXT)
+        return
 
     if need_clarification:
         clarifying_texts = [
@@ -330,20 +326,11 @@ async def clarification_handler(message: types.Message, state: FSMContext):
         await message.answer(clarifying_question)
         return
 
+    cards = index_manager.cards
+    await answer_products(message, [cards.regular(product) for product in results], footer=FOLLOW_UP_TEXT)
     for product in results:
-        update_popular_product(product)
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="Перейти", url=product['link'])]
-        ])
-        text = (
-            f"<b>{product['name']}</b>\n\n"
-            f"<b>Категория:</b> {product['category']}\n\n"
-            f"{product['description']}\n\n"
-            f"<b>Цена:</b> {product['price']} руб."
-        )
-        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+        popularity_store.increment(product)
         log_session(message.from_user, "result_sent", f"Product: {product['name']} | Price: {product['price']}")
-    await message.answer("Если ещё что-то ищите, напишите 👇")
     await state.clear()
 
 @router.message()
@@ -354,7 +341,11 @@ async def initial_query_handler(message: types.Message, state: FSMContext):
 
     query = message.text
     log_session(message.from_user, "query", query)
-    results, need_clarification = product_search_instance.search(query)
+    try:
+        results, need_clarification = await search_executor.search(index_manager.current, query)
+    except SearchUnavailableError:
+        await message.answer(BUSY_TEXT)
+        return
 
     if need_clarification:
         await state.update_data(original_query=query, accumulated_clarification="")
@@ -372,18 +363,8 @@ async def initial_query_handler(message: types.Message, state: FSMContext):
         )
         return
 
+    cards = index_manager.cards
+    await answer_products(message, [cards.regular(product) for product in results], footer=FOLLOW_UP_TEXT)
     for product in results:
-        update_popular_product(product)
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="Перейти", url=product['link'])]
-        ])
-        text = (
-            f"<b>{product['name']}</b>\n\n"
-            f"Категория: {product['category']}\n\n"
-            f"{product['description']}\n\n"
-            f"Цена: {product['price']}"
-        )
-        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
-        log_session(message.from_user, "result_sent", f"Product: {product['name']} | Price: {product['price']}")
-
-    await message.answer("Если ещё что-то ищите, напишите 👇")
\ No newline at end of file
+        popularity_store.increment(product)
+        log_session(message.from_user, "result_sent", f"Product: {product['name']} | Price: {product['price']}")
\ No newline at end of file
@@ -0,0 +1,251 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from config import DATASET_FILE, INDEX_DIR, INDEX_RELOAD_INTERVAL, INGEST_COMPACT_INTERVAL, INGEST_COMPACT_RATIO
+from data import (
+    ProductSearch, IndexStaleError, IndexValidationError, file_checksum, get_russian_stopwords, validate_index,
+)
+from ingest import Catalog, IngestReport
+from product_cards import ProductCards
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RebuildReport:
+    """Итог перестроения индекса, который показывается администратору."""
+    version: int
+    products: int
+    duration: float
+    ingest: IngestReport = None
+
+
+class IndexManager:
+    """
+    Хранит текущую версию поискового индекса и подменяет её после перестроения.
+
+    Обработчики берут индекс через `current` один раз на запрос, поэтому поиск,
+    начатый до подмены, доработает на старой версии.
+    Дельты каталога (см. ingest.py) применяются к Catalog и дают новую версию без полной
+    пересборки; фоновая задача раз в compact_interval секунд уплотняет индекс после дельт.
+    Воркеры вебхука делят index_dir: версию, которую сохранил другой воркер, менеджер загружает
+    при проверке раз в reload_interval секунд.
+    """
+
+    def __init__(self, csv_file, index_dir=None, compact_interval=INGEST_COMPACT_INTERVAL,
+                 reload_interval=INDEX_RELOAD_INTERVAL):
+        self.csv_file = csv_file
+        self.index_dir = index_dir
+        self.compact_interval = compact_interval
+        self.reload_interval = reload_interval
+        # Отметка meta.json версии индекса на диске, которую этот процесс загрузил или сохранил сам
+        self._index_stamp = None
+        self._versions = itertools.count(1)
+        # Состояние каталога для дельт создаётся при первой дельте и хранится, пока приходят дельты:
+        # его словарь id -> позиция занимает память на каждый товар, а без дельт не нужен
+        self._catalog = None
+        self._current = self._load_or_build(csv_file)
+        self._current.version = next(self._versions)
+        self._cards = ProductCards(self._current)
+        # Перестроения выполняются по одному в отдельном потоке, чтобы не блокировать event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-rebuild")
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._reload_task = None
+
+    @property
+    def current(self) -> ProductSearch:
+        return self._current
+
+    @property
+    def cards(self) -> ProductCards:
+        """Карточки товаров текущей версии индекса."""
+        return self._cards
+
+    @property
+    def version(self) -> int:
+        return self._current.version
+
+    def _load_or_build(self, csv_file):
+        """При старте берёт предсобранный индекс, если он свежий, иначе строит его из CSV."""
+        if self.index_dir is not None and os.path.exists(self.index_dir):
+            try:
+                stamp = self._saved_stamp()
+                search = ProductSearch.load(self.index_dir, csv_file)
+                self._index_stamp = stamp
+                return search
+            except IndexStaleError as e:
+                logger.warning("Предсобранный индекс не используется: %s", e)
+        search, _ = self._ingest(csv_file)
+        self._save(search)
+        return search
+
+    def _save(self, search):
+        if self.index_dir is None:
+            return
+        try:
+            search.save(self.index_dir)
+        except OSError:
+            logger.exception("Не удалось сохранить индекс в %s", self.index_dir)
+            return
+        self._index_stamp = self._saved_stamp()
+
+    def _saved_stamp(self):
+        """Отметка версии индекса в index_dir: save подменяет каталог целиком, и у meta.json новый inode."""
+        try:
+            stat = os.stat(os.path.join(self.index_dir, "meta.json"))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino
+
+    @staticmethod
+    def _ingest(csv_file):
+        catalog = Catalog(get_russian_stopwords())
+        _, report = catalog.apply(csv_file)
+        if report.delta:
+            raise IndexValidationError("это дельта (есть столбец op), а не полный каталог")
+        return ProductSearch.from_catalog(catalog, file_checksum(csv_file)), report
+
+    def _build(self, csv_file):
+        started = time.perf_counter()
+        search, report = self._ingest(csv_file)
+        validate_index(search)
+        duration = time.perf_counter() - started
+        # Сохраняем индекс на диск, чтобы следующий запуск бота не перестраивал его
+        self._save(search)
+        return search, None, report, duration
+
+    def _apply_delta(self, path):
+        started = time.perf_counter()
+        catalog = self._catalog if self._catalog is not None else Catalog.from_search(self._current)
+        # Пока новая версия не прошла проверку, состояние каталога не считается текущим
+        self._catalog = None
+        changed, report = catalog.apply(path)
+        if not report.delta:
+            raise IndexValidationError("в файле нет столбца op: полный каталог загружается через перестроение")
+        previous = self._current
+        if len(catalog.live) and 1 - catalog.size / len(catalog.live) > INGEST_COMPACT_RATIO:
+            catalog.compact()
+            previous = changed = None
+        search = ProductSearch.from_catalog(catalog, None, previous=previous, changed=changed)
+        validate_index(search)
+        # dataset.csv переписывается, чтобы /get_dataset и следующий запуск видели каталог с дельтой
+        temp_file = f"{self.csv_file}.tmp"
+        catalog.write_csv(temp_file)
+        os.replace(temp_file, self.csv_file)
+        search.source_checksum = file_checksum(self.csv_file)
+        duration = time.perf_counter() - started
+        self._save(search)
+        return search, catalog, report, duration
+
+    def _compact(self):
+        catalog = self._catalog
+        if catalog is None or not catalog.dirty:
+            return None
+        started = time.perf_counter()
+        # До подмены версии состояние каталога не считается текущим (см. _apply_delta)
+        self._catalog = None
+        catalog.compact()
+        search = ProductSearch.from_catalog(catalog, self._current.source_checksum)
+        validate_index(search)
+        duration = time.perf_counter() - started
+        self._save(search)
+        return search, catalog, None, duration
+
+    def _reload(self):
+        """Загружает версию индекса, которую сохранил в index_dir другой воркер."""
+        stamp = self._saved_stamp()
+        if stamp is None or stamp == self._index_stamp:
+            return None
+        started = time.perf_counter()
+        search = ProductSearch.load(self.index_dir)
+        if self._saved_stamp() != stamp:
+            # Каталог подменили во время загрузки: массивы могут быть от разных версий
+            return None
+        self._index_stamp = stamp
+        return search, None, None, time.perf_counter() - started
+
+    async def _run(self, build, *args):
+        """Выполняет build в потоке перестроений и подменяет текущую версию его результатом."""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            built = await loop.run_in_executor(self._executor, build, *args)
+            if built is None:
+                return None
+            search, catalog, report, duration = built
+            search.version = next(self._versions)
+            cards = ProductCards(search)
+            # Подмена между двумя await: новые запросы сразу видят новую версию индекса и карточек
+            self._current, self._cards, self._catalog = search, cards, catalog
+            return RebuildReport(version=search.version, products=search.products_count,
+                                 duration=duration, ingest=report)
+
+    async def rebuild(self, csv_file) -> RebuildReport:
+        """Собирает индекс из csv_file в фоне, проверяет его и атомарно подменяет текущий."""
+        return await self._run(self._build, csv_file)
+
+    async def apply_delta(self, path) -> RebuildReport:
+        """
+        Применяет дельту каталога: меняются только строки затронутых товаров, IDF старых
+        терминов остаётся прежним до уплотнения. dataset.csv переписывается с учётом дельты.
+        """
+        return await self._run(self._apply_delta, path)
+
+    async def compact(self):
+        """Уплотняет индекс после дельт: убирает удалённые товары и пересчитывает IDF."""
+        return await self._run(self._compact)
+
+    async def _compact_periodically(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                report = await self.compact()
+            except Exception:
+                logger.exception("Не удалось уплотнить индекс")
+                continue
+            if report is not None:
+                logger.info("Индекс уплотнён: версия %s, товаров %s, %.2f с",
+                            report.version, report.products, report.duration)
+
+    async def reload(self):
+        """Подменяет текущую версию индексом из index_dir, если его сохранил другой воркер."""
+        if self.index_dir is None:
+            return None
+        return await self._run(self._reload)
+
+    async def _reload_periodically(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                report = await self.reload()
+            except (IndexStaleError, OSError) as e:
+                # Другой воркер как раз подменяет каталог индекса: попробуем при следующей проверке
+                logger.warning("Не удалось загрузить индекс из %s: %s", self.index_dir, e)
+                continue
+            except Exception:
+                logger.exception("Не удалось загрузить индекс из %s", self.index_dir)
+                continue
+            if report is not None:
+                logger.info("Загружен индекс другого воркера: версия %s, товаров %s",
+                            report.version, report.products)
+
+    def start(self):
+        if self._task is None and self.compact_interval > 0:
+            self._task = asyncio.create_task(self._compact_periodically())
+        if self._reload_task is None and self.index_dir is not None and self.reload_interval > 0:
+            self._reload_task = asyncio.create_task(self._reload_periodically())
+
+    async def close(self):
+        for task in (self._task, self._reload_task):
+            if task is not None:
+                task.cancel()
+        self._task = self._reload_task = None
+
+
+# Создаем менеджер индекса (файл dataset.csv должен находиться в корне проекта)
+index_manager = IndexManager(DATASET_FILE, INDEX_DIR)
@@ -0,0 +1,457 @@
+"""
+Потоковая загрузка каталога товаров и инкрементальные обновления поискового индекса.
+
+CSV с разделителем ";" читается модулем csv пачками по INGEST_CHUNK_SIZE строк:
+каждая строка проверяется, разбивается на термины и сразу превращается в строку
+матрицы частот, а поля товара — в записи компактного хранилища (см. product_store.py),
+поэтому в памяти нет ни DataFrame, ни склеенного текста товаров.
+Некорректные строки пропускаются и попадают в отчёт IngestReport.
+
+Файл со столбцом op — дельта: op=add добавляет товар, update заменяет товар с тем же id,
+remove удаляет его. Дельта меняет только строки затронутых товаров: удалённые товары
+помечаются и остаются пустыми строками матрицы, новые термины дописываются в словарь,
+а IDF старых терминов не пересчитывается. Catalog.compact убирает удалённые товары,
+неиспользуемые термины и пересчитывает IDF по всему каталогу.
+"""
+import bisect
+import csv
+import math
+from array import array
+from collections import defaultdict, namedtuple
+from dataclasses import dataclass, field
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from config import INGEST_BAD_ROWS_LIMIT, INGEST_CHUNK_SIZE
+from product_store import ProductStore, encode_records, offsets_from_lengths
+from query_parser import ProductLabels
+
+CATALOG_COLUMNS = ["id", "name", "description", "category", "price", "link"]
+REQUIRED_COLUMNS = ["name", "description", "category", "price", "link"]
+OPERATIONS = ("add", "update", "remove")
+
+# Строка каталога после проверки; line — номер строки в файле для отчёта
+CatalogRow = namedtuple("CatalogRow", ["line", "op", "id", "name", "description", "category", "price", "link"])
+
+
+class CatalogFormatError(ValueError):
+    """Файл каталога нельзя загрузить: он пуст или в нём нет нужных столбцов."""
+
+
+@dataclass
+class IngestReport:
+    """Итог загрузки файла: число строк по операциям и первые по номеру некорректные строки с причиной."""
+    delta: bool = False
+    rows: int = 0
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    bad: int = 0
+    bad_rows: list = field(default_factory=list)
+    bad_rows_limit: int = INGEST_BAD_ROWS_LIMIT
+
+    def reject(self, line, reason):
+        self.bad += 1
+        # Строки отбраковываются и при разборе, и при применении пачки к каталогу (позже),
+        # поэтому список держится отсортированным по номеру строки
+        bisect.insort(self.bad_rows, (line, reason))
+        if len(self.bad_rows) > self.bad_rows_limit:
+            self.bad_rows.pop()
+
+
+def parse_price(value):
+    """Цена из CSV: пробелы-разделители тысяч убираются, запятая заменяется точкой; иначе None."""
+    try:
+        price = float("".join(value.split()).replace(",", "."))
+    except ValueError:
+        return None
+    return price if math.isfinite(price) else None
+
+
+def format_price(price):
+    """Цена для записи в CSV: без дробной части, если она нулевая."""
+    return str(int(price)) if float(price).is_integer() else repr(float(price))
+
+
+def _open(path):
+    # utf-8-sig: dataset.csv из Excel начинается с BOM
+    return open(path, newline="", encoding="utf-8-sig")
+
+
+def _read_header(reader):
+    header = next(reader, None)
+    if not header:
+        raise CatalogFormatError("файл пуст")
+    return {name.strip().lower(): i for i, name in enumerate(header)}
+
+
+def is_delta_feed(path):
+    """True, если в файле есть столбец op, то есть это дельта, а не полный каталог."""
+    with _open(path) as f:
+        return "op" in _read_header(csv.reader(f, delimiter=";"))
+
+
+def _parse_row(line, values, columns, delta):
+    """CatalogRow или строка с причиной, по которой строка некорректна."""
+    if len(values) != len(columns):
+        return f"ожидалось полей: {len(columns)}, получено: {len(values)}"
+
+    def get(name):
+        return values[columns[name]].strip() if name in columns else ""
+
+    op = get("op").lower() if delta else "add"
+    if op not in OPERATIONS:
+        return f"неизвестная операция {op!r}"
+    product_id = get("id")
+    if not product_id:
+        if delta:
+            return "нет id"
+        # В полном каталоге без id товар получает номер строки данных, как в dataset.csv
+        product_id = str(line - 1)
+    if op == "remove":
+        return CatalogRow(line, op, product_id, "", "", "", 0.0, "")
+    price = parse_price(get("price"))
+    if price is None:
+        return f"некорректная цена {get('price')!r}"
+    return CatalogRow(line, op, product_id, get("name"), get("description"), get("category"), price, get("link"))
+
+
+def read_catalog(path, report, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Читает каталог или дельту пачками по chunk_size проверенных строк.
+    Некорректные строки учитываются в report и пропускаются.
+    """
+    with _open(path) as f:
+        reader = csv.reader(f, delimiter=";")
+        columns = _read_header(reader)
+        report.delta = "op" in columns
+        required = REQUIRED_COLUMNS if not report.delta else ["id"]
+        missing = [name for name in required if name not in columns]
+        if missing:
+            raise CatalogFormatError(f"в файле нет столбцов: {', '.join(missing)}")
+        chunk = []
+        try:
+            for values in reader:
+                if not any(value.strip() for value in values):
+                    continue
+                report.rows += 1
+                row = _parse_row(reader.line_num, values, columns, report.delta)
+                if isinstance(row, str):
+                    report.reject(reader.line_num, row)
+                    continue
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        except csv.Error as e:
+            raise CatalogFormatError(f"строка {reader.line_num}: {e}") from e
+        if chunk:
+            yield chunk
+
+
+def smooth_idf(doc_freq, n_documents):
+    """IDF с теми же параметрами, что у TfidfVectorizer по умолчанию (smooth_idf=True)."""
+    return np.log((1 + n_documents) / (1 + doc_freq)) + 1
+
+
+def _replace_rows(matrix, positions, rows, shape):
+    """
+    Новая CSR-матрица формы shape: строки positions берутся из rows, остальные — из matrix.
+    Исходная матрица не меняется, поэтому её может продолжать читать предыдущая версия индекса.
+    """
+    rows = sparse.csr_matrix(rows)
+    if np.array_equal(positions, np.arange(matrix.shape[0], shape[0])):
+        # Только новые товары в конце (полный каталог, дельта из одних add): строки дописываются
+        rows = sparse.csr_matrix((rows.data, rows.indices, rows.indptr), shape=(len(positions), shape[1]))
+        if matrix.shape[0] == 0:
+            return rows
+        matrix = sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], shape[1]))
+        return sparse.vstack([matrix, rows], format="csr")
+    matrix = matrix.tocoo()
+    keep = ~np.isin(matrix.row, positions)
+    rows = rows.tocoo()
+    return sparse.csr_matrix(
+        (np.concatenate([matrix.data[keep], rows.data]),
+         (np.concatenate([matrix.row[keep], positions[rows.row]]),
+          np.concatenate([matrix.col[keep], rows.col]))),
+        shape=shape,
+    )
+
+
+def _vocabulary(terms=()):
+    """Словарь термин -> номер столбца, который сам нумерует новые термины при обращении по ключу."""
+    vocabulary = defaultdict(None, ((term, column) for column, term in enumerate(terms)))
+    vocabulary.default_factory = vocabulary.__len__
+    return vocabulary
+
+
+def _grow(array, size, fill):
+    """Копия array, дополненная значением fill до длины size."""
+    return np.concatenate([array, np.full(max(0, size - len(array)), fill, dtype=array.dtype)])
+
+
+class _Staged:
+    """
+    Принятые строки add/update одной загрузки до сборки матриц и хранилища товаров.
+    Записи нумеруются по порядку; для каждой хранятся позиция товара, строки матрицы частот,
+    строковые поля в UTF-8, цена и метки. Всё лежит в компактных буферах, а не в объектах на строку.
+    """
+
+    def __init__(self, size):
+        # Размер каталога с учётом добавленных товаров: следующая свободная позиция
+        self.size = size
+        self.records = 0
+        self.removed = set()
+        self.positions, self.counts, self.strings, self.lengths = [], [], [], []
+        self.prices = array("d")
+        self.category_ids = array("i")
+        self.attribute_records = array("q")
+        self.attribute_ids = array("i")
+
+
+class Catalog:
+    """
+    Изменяемое состояние каталога, из которого собираются версии ProductSearch.
+
+    Хранит товары (ProductStore), матрицу частот терминов (counts), документные частоты,
+    IDF и TF-IDF матрицу, а также метки для фильтров. Хранилище, матрицы и массивы меток
+    не меняются на месте — каждое изменение создаёт новые объекты, поэтому уже собранные версии
+    индекса продолжают работать, пока загружается следующая.
+    Методы вызываются из одного потока (см. IndexManager).
+    """
+
+    def __init__(self, stop_words=None):
+        self.stop_words = list(stop_words) if stop_words else None
+        self._analyzer = TfidfVectorizer(stop_words=self.stop_words).build_analyzer()
+        self.vocabulary = _vocabulary()
+        self.products = ProductStore.empty()
+        # id товара -> позиция; удалённых товаров здесь нет
+        self._positions = {}
+        self.live = np.empty(0, dtype=bool)
+        self.labels = ProductLabels()
+        self.attribute_positions = np.empty(0, dtype=np.int64)
+        self.attribute_ids = np.empty(0, dtype=np.int32)
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.tfidf = sparse.csr_matrix((0, 0))
+        self.doc_freq = np.empty(0, dtype=np.int64)
+        self.idf = np.empty(0)
+        # IDF устарел: после последнего уплотнения применялись дельты
+        self.dirty = False
+
+    @classmethod
+    def from_search(cls, search):
+        """Состояние каталога по загруженной версии индекса, чтобы применять к ней дельты."""
+        self = cls(search.vectorizer.stop_words)
+        terms = [None] * len(search.vectorizer.vocabulary_)
+        for term, column in search.vectorizer.vocabulary_.items():
+            terms[column] = term
+        self.vocabulary = _vocabulary(terms)
+        self.products = search.products
+        self.live = np.ones(len(self.products), dtype=bool) if search.live is None else np.array(search.live)
+        self._positions = {product_id: position for position, product_id in enumerate(self.products.column("id"))
+                           if self.live[position]}
+        self.labels = search.filters.labels
+        self.attribute_positions = np.array(search.filters.attribute_positions)
+        self.attribute_ids = np.array(search.filters.attribute_ids)
+        self.counts = search.counts
+        self.tfidf = search.tfidf_matrix
+        self.doc_freq = np.bincount(self.counts.indices, minlength=len(self.vocabulary)).astype(np.int64)
+        self.idf = np.array(search.vectorizer.idf_)
+        self.dirty = not search.compacted
+        return self
+
+    @property
+    def size(self):
+        """Число товаров без удалённых."""
+        return len(self._positions)
+
+    def apply(self, path, chunk_size=INGEST_CHUNK_SIZE):
+        """
+        Загружает полный каталог (все строки — add) или дельту и возвращает
+        (позиции изменённых товаров, IngestReport). Матрицы и хранилище пересобираются один раз в конце.
+        """
+        report = IngestReport()
+        staged = _Staged(len(self.products))
+        for chunk in read_catalog(path, report, chunk_size):
+            self._stage(chunk, report, staged)
+        if not staged.records and not staged.removed:
+            return np.empty(0, dtype=np.int64), report
+        changed = self._commit(staged)
+        if report.delta:
+            self.dirty = True
+        return changed, report
+
+    def _stage(self, chunk, report, staged):
+        """Применяет операции пачки к словарю id -> позиция и дописывает принятые строки в staged."""
+        positions, texts, records = [], [], []
+        for row in chunk:
+            position = self._positions.get(row.id)
+            if row.op == "remove":
+                if position is None:
+                    report.reject(row.line, f"товара {row.id} нет в каталоге")
+                    continue
+                del self._positions[row.id]
+                staged.removed.add(position)
+                report.removed += 1
+                continue
+            if row.op == "add":
+                if position is not None:
+                    report.reject(row.line, f"товар {row.id} уже есть в каталоге")
+                    continue
+                position = self._positions[row.id] = staged.size
+                staged.size += 1
+                report.added += 1
+            elif position is None:
+                report.reject(row.line, f"товара {row.id} нет в каталоге")
+                continue
+            else:
+                report.updated += 1
+            category_id, attributes = self.labels.label(row.name, row.category)
+            staged.prices.append(row.price)
+            staged.category_ids.append(category_id)
+            staged.attribute_records.extend([staged.records + len(positions)] * len(attributes))
+            staged.attribute_ids.extend(attributes)
+            positions.append(position)
+            texts.append(f"{row.name} {row.description} {row.category}")
+            records.append((row.id, row.name, row.description, row.link))
+        strings, lengths = encode_records(records)
+        staged.positions.append(np.asarray(positions, dtype=np.int64))
+        staged.counts.append(self._count(texts))
+        staged.strings.append(strings)
+        staged.lengths.append(lengths)
+        staged.records += len(positions)
+
+    def _count(self, texts):
+        """Строки матрицы частот для текстов; новые термины дописываются в словарь."""
+        indptr = [0]
+        indices = []
+        for text in texts:
+            # Обращение к словарю по ключу добавляет незнакомый термин со следующим номером
+            indices.extend(map(self.vocabulary.__getitem__, self._analyzer(text)))
+            indptr.append(len(indices))
+        counts = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+            shape=(len(texts), len(self.vocabulary)),
+        )
+        # Повторы термина в одном тексте складываются в его частоту
+        counts.sum_duplicates()
+        return counts
+
+    def _commit(self, staged):
+        """Собирает новые матрицы, хранилище и метки из staged; возвращает позиции изменённых товаров."""
+        size, n_terms = staged.size, len(self.vocabulary)
+        positions = np.concatenate(staged.positions)
+        removed = np.asarray(sorted(staged.removed), dtype=np.int64)
+
+        # Для позиции, записанной несколько раз, берём последнюю запись
+        records = np.arange(len(positions))
+        if len(positions) > 1 and not np.all(np.diff(positions) > 0):
+            positions, last = np.unique(positions[::-1], return_index=True)
+            records = len(records) - 1 - last
+        # Товары, добавленные и удалённые в одной дельте, получают строки в хранилище, но остаются удалёнными
+        products = self.products.replaced(
+            positions, (b"".join(staged.strings), offsets_from_lengths(np.concatenate(staged.lengths))), records,
+            self._column(self.products.prices, staged.prices, positions, records, size),
+            self._column(self.products.category_ids, staged.category_ids, positions, records, size),
+            self.labels.category_names,
+        )
+        written = ~np.isin(positions, removed)
+        positions, records = positions[written], records[written]
+        changed = np.union1d(positions, removed)
+
+        rows = sparse.vstack([sparse.csr_matrix((block.data, block.indices, block.indptr),
+                                                shape=(block.shape[0], n_terms)) for block in staged.counts],
+                             format="csr")
+        if not np.array_equal(records, np.arange(rows.shape[0])):
+            rows = rows[records]
+
+        # Документные частоты: убираем старые строки изменённых товаров и добавляем новые
+        doc_freq = _grow(self.doc_freq, n_terms, 0)
+        np.subtract.at(doc_freq, self.counts[changed[changed < self.counts.shape[0]]].indices, 1)
+        np.add.at(doc_freq, rows.indices, 1)
+        self.doc_freq = doc_freq
+        # Новые термины получают IDF по текущему каталогу, IDF старых терминов ждёт уплотнения
+        if n_terms > len(self.idf):
+            self.idf = np.concatenate([self.idf, smooth_idf(doc_freq[len(self.idf):], self.size)])
+
+        weights = self._weigh(rows)
+        matrix_positions = positions
+        if len(removed):
+            # Удалённые товары остаются пустыми строками до уплотнения
+            matrix_positions = np.concatenate([positions, removed])
+            empty = sparse.csr_matrix((len(removed), n_terms), dtype=np.int32)
+            rows, weights = sparse.vstack([rows, empty]), sparse.vstack([weights, empty])
+        self.counts = _replace_rows(self.counts, matrix_positions, rows, (size, n_terms))
+        self.tfidf = _replace_rows(self.tfidf, matrix_positions, weights, (size, n_terms))
+
+        self.products = products
+        self.live = _grow(self.live, size, False)
+        self.live[positions] = True
+        self.live[removed] = False
+
+        # Атрибуты записанных товаров: номер записи -> позиция, записи, перекрытые более поздними, отбрасываются
+        record_positions = np.full(staged.records, -1, dtype=np.int64)
+        record_positions[records] = positions
+        attribute_positions = record_positions[np.asarray(staged.attribute_records, dtype=np.int64)]
+        attribute_ids = np.asarray(staged.attribute_ids, dtype=np.int32)
+        fresh = attribute_positions >= 0
+        keep = ~np.isin(self.attribute_positions, changed)
+        self.attribute_positions = np.concatenate([self.attribute_positions[keep], attribute_positions[fresh]])
+        self.attribute_ids = np.concatenate([self.attribute_ids[keep], attribute_ids[fresh]])
+        return changed
+
+    @staticmethod
+    def _column(column, values, positions, records, size):
+        """Копия столбца хранилища длины size, в которой positions получают значения записей records."""
+        column = _grow(column, size, 0)
+        column[positions] = np.asarray(values)[records]
+        return column
+
+    def _weigh(self, counts):
+        """TF-IDF строки с L2-нормой, как у TfidfVectorizer; структура строк общая с counts."""
+        counts = sparse.csr_matrix(counts)
+        weights = sparse.csr_matrix(
+            (counts.data * self.idf[counts.indices], counts.indices, counts.indptr), shape=counts.shape)
+        return normalize(weights, norm="l2", copy=False) if weights.shape[0] else weights
+
+    def compact(self):
+        """
+        Убирает удалённые товары и неиспользуемые термины и пересчитывает IDF и TF-IDF
+        по всему каталогу. Позиции товаров и номера терминов меняются.
+        """
+        keep = np.flatnonzero(self.live)
+        remap = np.full(len(self.live), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        self.products = self.products.take(keep)
+        self._positions = {product_id: position for position, product_id in enumerate(self.products.column("id"))}
+        self.live = np.ones(len(keep), dtype=bool)
+        alive = remap[self.attribute_positions] >= 0
+        self.attribute_positions = remap[self.attribute_positions[alive]]
+        self.attribute_ids = self.attribute_ids[alive]
+
+        used = np.flatnonzero(self.doc_freq > 0)
+        terms = np.empty(len(self.vocabulary), dtype=object)
+        for term, column in self.vocabulary.items():
+            terms[column] = term
+        self.vocabulary = _vocabulary(terms[used])
+        self.counts = sparse.csr_matrix(self.counts[keep][:, used], dtype=np.int32)
+        self.doc_freq = self.doc_freq[used]
+        self.idf = smooth_idf(self.doc_freq, len(keep))
+        self.tfidf = self._weigh(self.counts)
+        self.dirty = False
+
+    def write_csv(self, path):
+        """Пишет товары без удалённых в CSV того же формата, что dataset.csv."""
+        products = self.products
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(CATALOG_COLUMNS)
+            for position in np.flatnonzero(self.live):
+                writer.writerow([
+                    products.get(position, "id"), products.get(position, "name"),
+                    products.get(position, "description"), products.category(position),
+                    format_price(products.price(position)), products.get(position, "link"),
+                ])
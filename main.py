@@ -1,16 +1,60 @@
 import asyncio
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN
+from analytics import session_aggregates
+from config import BOT_TOKEN, FSM_STORAGE, TELEGRAM_API_SERVER
 from handlers import router
+from index_manager import index_manager
+from metrics import UpdateMetricsMiddleware, metrics_server
+from popularity import popularity_store
+from search_executor import search_executor
+from sender import send_scheduler
+from session_log import other_worker_logs, session_log, worker_logs
+from sqlite_storage import SQLiteStorage
 
-async def main():
-    storage = MemoryStorage()
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode='HTML'))
+async def on_startup():
+    await metrics_server.start()
+    popularity_store.start()
+    index_manager.start()
+    # Агрегаты дочитывают журналы воркеров с места последнего сохранения до того, как пойдут новые события
+    await asyncio.to_thread(session_aggregates.restore, worker_logs())
+    session_aggregates.start(session_log, other_worker_logs)
+    session_log.start()
+
+async def on_shutdown():
+    await session_log.close()
+    await session_aggregates.close(session_log, other_worker_logs())
+    await popularity_store.close()
+    await index_manager.close()
+    search_executor.shutdown()
+    await metrics_server.stop()
+
+def create_bot():
+    if TELEGRAM_API_SERVER:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER))
+    else:
+        session = AiohttpSession()
+    # Все запросы к Bot API проходят через планировщик с ограничением частоты отправки
+    session.middleware(send_scheduler)
+    return Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode='HTML'))
+
+def create_dispatcher():
+    """Диспетчер с обработчиками бота; общий для long polling и вебхука (webhook.py)."""
+    storage = SQLiteStorage() if FSM_STORAGE == "sqlite" else MemoryStorage()
     dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
     dp.include_router(router)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+async def main():
+    bot = create_bot()
+    dp = create_dispatcher()
     await dp.start_polling(bot)
 
 if __name__ == '__main__':
@@ -0,0 +1,303 @@
+"""
+Метрики горячих путей бота: длительности этапов поиска, записи журнала и счётчиков
+популярности, отправки в Telegram, обработки обновлений и задержка event loop.
+
+Гистограммы отдаются в формате Prometheus на METRICS_HOST:METRICS_PORT/metrics, если порт
+задан, последние значения каждой серии хранятся для перцентилей в команде /latency.
+При PROFILER_ENABLED=1 доступен сэмплирующий профилировщик: /profile?seconds=N
+на том же порту или команда /profile отдают стеки в свёрнутом формате для flamegraph.
+"""
+import asyncio
+import bisect
+import collections
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+
+from aiogram import BaseMiddleware
+from aiohttp import web
+
+from config import (
+    METRICS_HOST, METRICS_PORT, METRICS_WINDOW, LOOP_LAG_INTERVAL,
+    PROFILER_ENABLED, PROFILER_INTERVAL, PROFILER_MAX_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(label, value, extra=""):
+    parts = [f'{label}="{_escape(value)}"'] if label else []
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Histogram:
+    """
+    Гистограмма длительностей с одной необязательной меткой (этап, метод API и т.п.).
+    Кроме корзин хранит последние window значений каждой серии для перцентилей.
+    Наблюдения можно добавлять из любых потоков.
+    """
+
+    def __init__(self, name, help_text, label=None, buckets=DEFAULT_BUCKETS, window=METRICS_WINDOW):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.window = window
+        # значение метки -> [счётчики корзин, сумма, количество, последние значения]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label=""):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0, collections.deque(maxlen=self.window)
+                ]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+            series[3].append(value)
+
+    @contextlib.contextmanager
+    def time(self, label=""):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, label)
+
+    def percentiles(self, fractions=(0.5, 0.95, 0.99)):
+        """Перцентили по последним значениям: {метка: (количество, [значения перцентилей])}."""
+        with self._lock:
+            recent = {label: sorted(series[3]) for label, series in self._series.items()}
+        result = {}
+        for label, values in recent.items():
+            if values:
+                result[label] = (len(values), [values[min(len(values) - 1, int(f * len(values)))] for f in fractions])
+        return result
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(label, list(s[0]), s[1], s[2]) for label, s in self._series.items()]
+        for label, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label, label, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label, label)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label, label)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, label=""):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.label, label)} {value}" for label, value in values)
+        return lines
+
+
+class Gauge:
+    """Текущее значение: задаётся через inc/dec или считается функцией func при каждом опросе."""
+
+    def __init__(self, name, help_text, func=None):
+        self.name = name
+        self.help_text = help_text
+        self.func = func
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def expose(self):
+        value = self.func() if self.func is not None else self.value
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, help_text, label=None, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, label, buckets))
+
+    def counter(self, name, help_text, label=None):
+        return self._register(Counter(name, help_text, label))
+
+    def gauge(self, name, help_text, func=None):
+        return self._register(Gauge(name, help_text, func))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self):
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Этапы поиска (parse, filter, vectorize, score, assemble) и фоновые записи (session_log_write, popularity_*)
+STAGE_SECONDS = metrics.histogram("gift_bot_stage_seconds", "Длительность этапов обработки запроса", "stage")
+UPDATE_SECONDS = metrics.histogram("gift_bot_update_seconds", "Время обработки обновления Telegram")
+UPDATES_IN_FLIGHT = metrics.gauge("gift_bot_updates_in_flight", "Обновления в обработке")
+TELEGRAM_SECONDS = metrics.histogram("gift_bot_telegram_request_seconds", "Длительность запросов к Bot API", "method")
+TELEGRAM_WAIT_SECONDS = metrics.histogram(
+    "gift_bot_telegram_wait_seconds", "Ожидание в планировщике отправки до запроса к Bot API")
+TELEGRAM_RETRY_AFTER = metrics.counter("gift_bot_telegram_retry_after_total", "Ответы RetryAfter от Telegram")
+LOOP_LAG_SECONDS = metrics.histogram("gift_bot_event_loop_lag_seconds", "Опоздание event loop относительно таймера")
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешнее middleware диспетчера: время обработки и число обновлений в работе."""
+
+    async def __call__(self, handler, event, data):
+        UPDATES_IN_FLIGHT.inc()
+        try:
+            with UPDATE_SECONDS.time():
+                return await handler(event, data)
+        finally:
+            UPDATES_IN_FLIGHT.dec()
+
+
+async def _watch_loop_lag(interval):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started - interval))
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик: раз в interval секунд снимает стеки всех потоков
+    через sys._current_frames и считает одинаковые стеки. Результат — строки
+    "файл:функция;...;файл:функция количество" (формат flamegraph.pl и speedscope).
+    """
+
+    def __init__(self, interval=PROFILER_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def _collect(self, seconds):
+        own = threading.get_ident()
+        stacks = collections.Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+        return stacks
+
+    async def profile(self, seconds):
+        """Профилирует процесс seconds секунд и возвращает свёрнутые стеки текстом."""
+        seconds = min(seconds, PROFILER_MAX_SECONDS)
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("профилирование уже идёт")
+        try:
+            stacks = await asyncio.to_thread(self._collect, seconds)
+        finally:
+            self._lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+profiler = SamplingProfiler() if PROFILER_ENABLED else None
+
+
+class MetricsServer:
+    """HTTP-сервер с /metrics (и /profile, если профилировщик включён) и слежение за задержкой event loop."""
+
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT, lag_interval=LOOP_LAG_INTERVAL):
+        self.host = host
+        self.port = port
+        self.lag_interval = lag_interval
+        self._runner = None
+        self._lag_task = None
+
+    async def _metrics(self, request):
+        return web.Response(text=metrics.expose(), content_type="text/plain", charset="utf-8")
+
+    async def _profile(self, request):
+        try:
+            seconds = float(request.query.get("seconds", "10"))
+            return web.Response(text=await profiler.profile(seconds), content_type="text/plain")
+        except ValueError:
+            return web.Response(status=400, text="seconds должно быть числом")
+        except RuntimeError as e:
+            return web.Response(status=409, text=str(e))
+
+    async def start(self):
+        self._lag_task = asyncio.create_task(_watch_loop_lag(self.lag_interval))
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        if profiler is not None:
+            app.router.add_get("/profile", self._profile)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            # Занятый порт не должен мешать боту работать: он просто остаётся без /metrics
+            logger.warning("Сервер метрик не запущен на %s:%s: %s", self.host, self.port, e)
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        logger.info("Метрики доступны на http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer()
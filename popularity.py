@@ -0,0 +1,209 @@
+import asyncio
+import bisect
+import csv
+import heapq
+import itertools
+import logging
+import os
+
+from config import POPULAR_FLUSH_INTERVAL, POPULAR_PRODUCTS_BASE, POPULAR_PRODUCTS_FILE
+from metrics import STAGE_SECONDS
+from worker_files import worker_paths
+
+logger = logging.getLogger(__name__)
+
+# id — позиция товара в индексе при последнем показе: по нему карточка берётся из кэша (см. product_cards.py)
+FIELDNAMES = ["id", "name", "category", "description", "price", "link", "count"]
+
+
+class PopularityStore:
+    """
+    Счётчики показов товаров в памяти с отложенной записью на диск.
+
+    Товары разложены по корзинам с одинаковым счётчиком, а сами счётчики хранятся
+    в отсортированном списке, поэтому увеличение счётчика и выбор топа не требуют
+    сортировки всех товаров. Снимок пишется в CSV того же формата, что и раньше,
+    раз в flush_interval секунд (если были изменения) и при остановке бота.
+
+    Каждый воркер вебхука пишет в CSV только свои показы, а в топ идут суммы по всем воркерам:
+    после записи снимка перечитываются изменившиеся файлы остальных воркеров (см. worker_files.py).
+    """
+
+    def __init__(self, path, flush_interval=POPULAR_FLUSH_INTERVAL, base_path=POPULAR_PRODUCTS_BASE):
+        self.path = path
+        self.base_path = base_path
+        self.flush_interval = flush_interval
+        # (name, link) -> [порядковый номер, счётчик по всем воркерам, данные товара, счётчик этого воркера]
+        self._products = {}
+        # файл другого воркера -> (отметка изменения файла, {ключ товара: [счётчик, данные товара]})
+        self._siblings = {}
+        # счётчик -> множество ключей товаров с таким счётчиком
+        self._buckets = {}
+        self._counts = []
+        self._seq = itertools.count()
+        self._dirty = False
+        self._task = None
+        self._load()
+
+    def _load(self):
+        """Восстанавливает счётчики из CSV, сохранённого предыдущим запуском, и счётчики остальных воркеров."""
+        if os.path.exists(self.path):
+            for key, (count, data) in self._read(self.path).items():
+                self._add(key, data, count, own=count)
+        self._apply_siblings(self._read_siblings())
+
+    @staticmethod
+    def _read(path):
+        counts = {}
+        with open(path, mode="r", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                count = int(row.pop("count"))
+                counts[(row["name"], row["link"])] = [count, row]
+        return counts
+
+    def _read_siblings(self):
+        """Файлы остальных воркеров; перечитываются только те, что изменились с прошлого раза."""
+        siblings = {}
+        for path in worker_paths(self.base_path):
+            if path == self.path:
+                continue
+            try:
+                stat = os.stat(path)
+                stamp = (stat.st_mtime_ns, stat.st_ino)
+                previous = self._siblings.get(path)
+                siblings[path] = previous if previous is not None and previous[0] == stamp else (stamp, self._read(path))
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, KeyError):
+                # Файл заменили во время чтения или он ещё не дописан: оставляем прошлые счётчики
+                logger.warning("Не удалось прочитать %s", path)
+                if path in self._siblings:
+                    siblings[path] = self._siblings[path]
+        return siblings
+
+    def _apply_siblings(self, siblings):
+        """Переносит разницу между прошлыми и новыми счётчиками остальных воркеров в общие счётчики."""
+        deltas = {}
+        for path in self._siblings.keys() | siblings.keys():
+            old, new = self._siblings.get(path), siblings.get(path)
+            if old is new:
+                continue
+            for key, (count, data) in (old[1] if old else {}).items():
+                deltas.setdefault(key, [0, data])[0] -= count
+            for key, (count, data) in (new[1] if new else {}).items():
+                deltas.setdefault(key, [0, data])[0] += count
+        self._siblings = siblings
+        for key, (delta, data) in deltas.items():
+            if delta:
+                self._add(key, data, delta)
+
+    def _add(self, key, data, amount, own=0):
+        entry = self._products.get(key)
+        if entry is None:
+            entry = self._products[key] = [next(self._seq), 0, data, 0]
+        else:
+            self._remove_from_bucket(key, entry[1])
+        entry[1] += amount
+        entry[3] += own
+        if entry[1] > 0:
+            self._add_to_bucket(key, entry[1])
+        else:
+            del self._products[key]
+
+    async def refresh(self):
+        """Подтягивает счётчики остальных воркеров из их файлов."""
+        try:
+            siblings = await asyncio.to_thread(self._read_siblings)
+        except OSError:
+            logger.exception("Не удалось прочитать файлы популярных товаров воркеров")
+            return
+        self._apply_siblings(siblings)
+
+    def _add_to_bucket(self, key, count):
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = set()
+            bisect.insort(self._counts, count)
+        bucket.add(key)
+
+    def _remove_from_bucket(self, key, count):
+        bucket = self._buckets[count]
+        bucket.discard(key)
+        if not bucket:
+            del self._buckets[count]
+            del self._counts[bisect.bisect_left(self._counts, count)]
+
+    def increment(self, product: dict):
+        """Увеличивает счётчик товара или добавляет его со счётчиком 1."""
+        with STAGE_SECONDS.time("popularity_increment"):
+            self._increment(product)
+
+    def _increment(self, product):
+        # Сравнение по уникальному идентификатору товара делаем по name и link
+        key = (product["name"], product["link"])
+        data = {field: product[field] for field in FIELDNAMES[:-1]}
+        self._add(key, data, 1, own=1)
+        # Данные товара берём из последнего показа: id меняется вместе с версией индекса
+        self._products[key][2] = data
+        self._dirty = True
+
+    def top(self, top_n=3):
+        """Возвращает top_n товаров по убыванию счётчика; при равенстве раньше идёт добавленный раньше."""
+        products = []
+        for count in reversed(self._counts):
+            needed = top_n - len(products)
+            if needed <= 0:
+                break
+            keys = heapq.nsmallest(needed, self._buckets[count], key=lambda k: self._products[k][0])
+            products.extend({**self._products[k][2], "count": count} for k in keys)
+        return products
+
+    def _snapshot(self):
+        # Словарь хранит товары в порядке добавления: после перезапуска порядок при равенстве сохранится.
+        # В файл воркера идут только его собственные показы
+        return [{**data, "count": own} for _, _, data, own in self._products.values() if own]
+
+    def _write(self, rows):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, mode="w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temp_path, self.path)
+
+    async def flush(self):
+        """Записывает снимок на диск, если с прошлой записи были изменения."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        rows = self._snapshot()
+        try:
+            with STAGE_SECONDS.time("popularity_flush"):
+                await asyncio.to_thread(self._write, rows)
+        except OSError:
+            self._dirty = True
+            logger.exception("Не удалось сохранить %s", self.path)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            await self.refresh()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        """Останавливает фоновую запись и сохраняет последние изменения."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+popularity_store = PopularityStore(POPULAR_PRODUCTS_FILE)
@@ -0,0 +1,115 @@
+import html
+from collections import namedtuple
+
+import numpy as np
+from aiogram.types import InlineKeyboardButton
+
+from sender import MESSAGE_LIMIT
+
+BUTTON_TEXT_LIMIT = 40
+# Предел постоянной части карточки: остаток сообщения — под цену, скидку и приглашение продолжить поиск
+HEAD_LIMIT = MESSAGE_LIMIT - 256
+# Диапазон случайной скидки в процентах для кнопки "Скидочные товары"
+DISCOUNT_RANGE = (10, 30)
+
+# Готовая карточка: HTML-текст и кнопка-ссылка на товар
+ProductCard = namedtuple("ProductCard", ["text", "button"])
+
+
+def format_price(price):
+    """Цена для показа: без дробной части, если она нулевая."""
+    price = round(float(price), 2)
+    return str(int(price)) if price.is_integer() else f"{price:.2f}"
+
+
+def _button(name, link):
+    if len(name) > BUTTON_TEXT_LIMIT:
+        name = name[:BUTTON_TEXT_LIMIT - 1].rstrip() + "…"
+    return InlineKeyboardButton(text=f"Перейти: {name}", url=link)
+
+
+def _head(product):
+    title = (
+        f"<b>{html.escape(str(product['name']))}</b>\n\n"
+        f"<b>Категория:</b> {html.escape(str(product['category']))}\n\n"
+    )
+    description = str(product['description'])
+    budget = max(0, HEAD_LIMIT - len(title) - 2)
+    text = html.escape(description)
+    # Длинное описание обрезается по исходному тексту, чтобы не разрезать HTML-сущность
+    if len(text) > budget:
+        description = description[:budget]
+        text = html.escape(description) + "…"
+        while len(text) > budget and description:
+            description = description[:-(len(text) - budget)]
+            text = html.escape(description.rstrip()) + "…"
+    return f"{title}{text}\n\n"
+
+
+class ProductCards:
+    """
+    Карточки товаров одной версии индекса.
+
+    Неизменная часть карточки (название, категория, описание) и кнопка со ссылкой
+    собираются один раз на товар — при первом показе — и хранятся по id товара
+    в индексе; при отправке к ним дописываются только цена, счётчик или скидка.
+    Все обработчики используют один шаблон, значения экранируются для HTML.
+    """
+
+    def __init__(self, search, seed=None):
+        self.search = search
+        size = len(search.products)
+        self._heads = [None] * size
+        self._buttons = [None] * size
+        # Пул для скидочной подборки выбирается один раз: товары с положительной ценой, кроме удалённых
+        in_pool = search.products.prices > 0
+        if search.live is not None:
+            in_pool &= search.live
+        self._discount_pool = np.flatnonzero(in_pool)
+        self._rng = np.random.default_rng(seed)
+
+    def _cached(self, position):
+        head = self._heads[position]
+        if head is None:
+            product = self.search.product(position)
+            head = self._heads[position] = _head(product)
+            self._buttons[position] = _button(product['name'], product['link'])
+        return head, self._buttons[position]
+
+    def _parts(self, product):
+        """Постоянная часть карточки и кнопка; товары не из этой версии индекса собираются заново."""
+        # id из CSV популярных товаров — строка, а у товаров из старых файлов его нет
+        position = product.get('id')
+        position = int(position) if position not in (None, '') else -1
+        if 0 <= position < len(self._heads) and self.search.products.get(position, 'link') == product['link']:
+            return self._cached(position)
+        return _head(product), _button(str(product['name']), product['link'])
+
+    def regular(self, product):
+        head, button = self._parts(product)
+        return ProductCard(f"{head}<b>Цена:</b> {format_price(product['price'])} руб.", button)
+
+    def popular(self, product):
+        head, button = self._parts(product)
+        return ProductCard(
+            f"{head}<b>Цена:</b> {format_price(product['price'])} руб.\n"
+            f"<b>Количество запросов:</b> {product['count']}",
+            button,
+        )
+
+    def discounted(self, count=3):
+        """Карточки count случайных товаров со случайной скидкой из DISCOUNT_RANGE."""
+        size = min(count, len(self._discount_pool))
+        positions = self._rng.choice(self._discount_pool, size=size, replace=False)
+        percents = self._rng.integers(DISCOUNT_RANGE[0], DISCOUNT_RANGE[1] + 1, size=size)
+        cards = []
+        for position, percent in zip(positions, percents):
+            head, button = self._cached(int(position))
+            price = self.search.products.price(int(position))
+            cards.append(ProductCard(
+                f"{head}<b>Старая цена:</b> {format_price(price)} руб.\n"
+                f"<b>Скидка:</b> {percent}%\n"
+                f"<b>Новая цена:</b> {format_price(price * (1 - percent / 100))} руб.",
+                button,
+            ))
+        return cards
@@ -0,0 +1,142 @@
+"""
+Компактное хранилище товаров по столбцам вместо pandas DataFrame.
+
+Строковые поля всех товаров (id из каталога, название, описание, ссылка) лежат в одном
+непрерывном буфере UTF-8, а массив offsets хранит границы полей: поле k товара p занимает
+buffer[offsets[p * 4 + k]:offsets[p * 4 + k + 1]]. Категории интернированы: у товара хранится
+номер категории, а названия категорий — один раз. Цены хранятся в float32.
+
+Строки декодируются только при обращении к товару по номеру, поэтому на каждый товар не
+заводятся объекты Python. Массивы не меняются после сборки: изменения каталога дают новое
+хранилище (см. replaced и take). Сохранённое хранилище открывается через mmap, и процессы,
+загрузившие один и тот же индекс, делят его страницы через кэш ОС; после fork массивы тоже
+остаются общими — их никто не пишет, и у них нет счётчиков ссылок на каждый товар.
+"""
+import json
+import os
+
+import numpy as np
+
+STRING_FIELDS = ("id", "name", "description", "link")
+FIELD_COUNT = len(STRING_FIELDS)
+_FIELD_INDEX = {field: index for index, field in enumerate(STRING_FIELDS)}
+
+
+def encode_records(records):
+    """Буфер UTF-8 и длины полей для записей (id, name, description, link)."""
+    encoded = [value.encode("utf-8") for record in records for value in record]
+    return b"".join(encoded), np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+
+
+def offsets_from_lengths(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _gather(sources, source_ids, records):
+    """
+    Буфер и offsets из записей нескольких источников (буфер, offsets): запись i результата —
+    запись records[i] источника source_ids[i]. Подряд идущие записи одного источника
+    копируются одним куском, поэтому число кусков пропорционально числу изменений, а не товаров.
+    """
+    offsets = np.zeros(len(records) * FIELD_COUNT + 1, dtype=np.int64)
+    if len(records) == 0:
+        return b"", offsets
+    breaks = np.flatnonzero((np.diff(source_ids) != 0) | (np.diff(records) != 1)) + 1
+    buffer, source_offsets = sources[source_ids[0]]
+    if len(breaks) == 0 and records[0] == 0 and len(source_offsets) == len(offsets):
+        # Результат совпадает с источником целиком (например, полный каталог): буфер не копируем
+        return buffer, source_offsets
+    pieces = []
+    total = 0
+    for start, end in zip(np.concatenate([[0], breaks]), np.concatenate([breaks, [len(records)]])):
+        buffer, source_offsets = sources[source_ids[start]]
+        first, last = records[start], records[end - 1]
+        block = source_offsets[first * FIELD_COUNT:(last + 1) * FIELD_COUNT + 1]
+        offsets[start * FIELD_COUNT:end * FIELD_COUNT + 1] = block - block[0] + total
+        pieces.append(memoryview(buffer)[block[0]:block[-1]])
+        total += int(block[-1] - block[0])
+    return b"".join(pieces), offsets
+
+
+class ProductStore:
+    """Товары одной версии каталога; доступ по номеру товара (позиции в индексе)."""
+
+    def __init__(self, buffer, offsets, prices, category_ids, category_names):
+        self.buffer = buffer
+        self._view = memoryview(buffer)
+        self.offsets = offsets
+        self.prices = np.asarray(prices, dtype=np.float32)
+        self.category_ids = np.asarray(category_ids, dtype=np.int32)
+        self.category_names = list(category_names)
+
+    @classmethod
+    def empty(cls):
+        return cls(b"", np.zeros(1, dtype=np.int64), np.empty(0), np.empty(0), [])
+
+    def __len__(self):
+        return len(self.prices)
+
+    @property
+    def nbytes(self):
+        """Объём данных хранилища в байтах (без названий категорий)."""
+        return len(self._view) + self.offsets.nbytes + self.prices.nbytes + self.category_ids.nbytes
+
+    def get(self, position, field):
+        index = position * FIELD_COUNT + _FIELD_INDEX[field]
+        return str(self._view[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+    def category(self, position):
+        return self.category_names[self.category_ids[position]]
+
+    def price(self, position):
+        # float32 хранит цену с погрешностью в младших разрядах: возвращаем её с точностью до копеек
+        return round(float(self.prices[position]), 2)
+
+    def column(self, field, positions=None):
+        """Значения строкового поля по порядку товаров (или для positions) без сборки списка."""
+        for position in range(len(self)) if positions is None else positions:
+            yield self.get(position, field)
+
+    def replaced(self, positions, segment, segment_records, prices, category_ids, category_names):
+        """
+        Новое хранилище размера len(prices): товары positions берут строки из записей
+        segment_records сегмента segment = (буфер, offsets), остальные — из этого хранилища.
+        Все позиции за пределами текущего размера должны быть среди positions.
+        """
+        size = len(prices)
+        source_ids = np.zeros(size, dtype=np.int8)
+        records = np.arange(size)
+        source_ids[positions] = 1
+        records[positions] = segment_records
+        if np.any(source_ids[len(self):] == 0):
+            raise ValueError("у новых позиций хранилища нет записей")
+        buffer, offsets = _gather([(self.buffer, self.offsets), segment], source_ids, records)
+        return ProductStore(buffer, offsets, prices, category_ids, category_names)
+
+    def take(self, positions):
+        """Хранилище из товаров positions в этом порядке (уплотнение после удалений)."""
+        buffer, offsets = _gather([(self.buffer, self.offsets)], np.zeros(len(positions), dtype=np.int8),
+                                  np.asarray(positions))
+        return ProductStore(buffer, offsets, self.prices[positions], self.category_ids[positions],
+                            self.category_names)
+
+    def save(self, directory):
+        np.save(os.path.join(directory, "strings.npy"), np.frombuffer(self._view, dtype=np.uint8))
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "prices.npy"), self.prices)
+        np.save(os.path.join(directory, "category_ids.npy"), self.category_ids)
+        with open(os.path.join(directory, "categories.json"), "w", encoding="utf-8") as f:
+            json.dump(self.category_names, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Загружает хранилище, сохранённое save; при mmap=True массивы отображаются в память."""
+        def load_array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+
+        with open(os.path.join(directory, "categories.json"), encoding="utf-8") as f:
+            category_names = json.load(f)
+        return cls(load_array("strings"), load_array("offsets"), load_array("prices"),
+                   load_array("category_ids"), category_names)
@@ -0,0 +1,73 @@
+import sys
+import time
+from collections import OrderedDict
+
+from config import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+
+
+def _deep_sizeof(value):
+    """Приблизительный объём памяти результата поиска: списки, словари, строки и числа."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_sizeof(item) for item in value)
+    return size
+
+
+class QueryCache:
+    """
+    LRU-кэш результатов поиска с ограничением по числу записей и времени жизни.
+
+    Ключ включает версию индекса, поэтому после перезагрузки каталога старые записи
+    больше не находятся и постепенно вытесняются.
+    """
+
+    def __init__(self, max_entries=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # ключ -> (момент истечения, результат, размер в байтах)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        size = _deep_sizeof(key) + _deep_sizeof(value)
+        self._entries[key] = (time.monotonic() + self.ttl, value, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self.bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self.bytes,
+        }
@@ -0,0 +1,302 @@
+"""
+Разбор поискового запроса на текст и фильтры: диапазон цены, категории каталога
+и атрибуты (цвет, для кого подарок).
+
+Фильтры применяются до ранжирования через заранее построенные индексы FilterIndex:
+товары, отсортированные по цене, и списки позиций товаров для каждой категории
+и значения атрибута. Стоимость фильтра зависит от числа подходящих товаров,
+а не от размера каталога.
+"""
+import functools
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+NUMBER = r"(\d+(?:[  ]\d{3})*)"
+CURRENCY = r"(?:руб(?:лей|ля|ль)?\.?|р\.|₽)"
+
+# Порядок важен: сначала диапазоны, затем одиночные границы
+PRICE_RANGE_PATTERN = re.compile(
+    rf"(?:\bот\s*{NUMBER}\s*(?:{CURRENCY}\s*)?до\s*{NUMBER}|\b{NUMBER}\s*[-–—]\s*{NUMBER})\s*{CURRENCY}",
+    re.IGNORECASE,
+)
+PRICE_MAX_PATTERN = re.compile(rf"\b(до|дешевле|не\s+дороже)\s*{NUMBER}\s*{CURRENCY}", re.IGNORECASE)
+PRICE_MIN_PATTERN = re.compile(rf"\b(?:от|дороже)\s*{NUMBER}\s*{CURRENCY}", re.IGNORECASE)
+
+ADJECTIVE_ENDINGS = r"(?:ый|ий|ой|ая|яя|ое|ее|ые|ие|ого|его|ой|ей|ую|юю|ых|их|ым|им|ыми|ими|ом|ем)"
+COLOURS = {
+    "красный": "красн", "синий": "син", "черный": "ч[её]рн", "белый": "бел", "коричневый": "коричнев",
+    "желтый": "ж[её]лт", "оранжевый": "оранжев", "зеленый": "зел[её]н", "розовый": "розов",
+    "серый": "сер", "голубой": "голуб", "фиолетовый": "фиолетов", "бежевый": "бежев",
+    "разноцветный": "разноцветн",
+}
+GENDERS = {"мужской": "мужск", "женский": "женск", "детский": "детск"}
+# Получатель подарка задаёт тот же атрибут, что и прилагательное "мужской/женский/детский"
+RECIPIENTS = {
+    "женский": ["мам[аеуы]", "маме", "мамочке", "жен[аеуы]", "девушк[аеиу]", "сестр[аеуы]", "бабушк[аеиу]",
+                "подруг[аеиу]", "доч(?:ке|ери|ь|ка)", "женщин[аеуы]", "т[её]т[аеуы]"],
+    "мужской": ["пап[аеуы]", "отц[уа]", "муж[ау]?", "парн[юя]", "брат[ау]?", "дедушк[аеиу]", "сын[ау]?",
+                "мужчин[аеуы]", "дяд[еюя]"],
+    "детский": ["реб[её]нк[ау]", "детям", "детей", "малыш[ау]", "школьник[ау]"],
+}
+
+
+_ATTRIBUTE_GROUPS = (
+    [(("colour", value), stem) for value, stem in COLOURS.items()]
+    + [(("gender", value), stem) for value, stem in GENDERS.items()]
+)
+_RECIPIENT_GROUPS = [(("gender", value), "|".join(words)) for value, words in RECIPIENTS.items()]
+
+# Имена групп вида g<номер>: по номеру находится атрибут
+PRODUCT_ATTRIBUTE_PATTERN = re.compile(
+    "|".join(rf"(?P<g{i}>\b(?:{stem}){ADJECTIVE_ENDINGS}\b)" for i, (_, stem) in enumerate(_ATTRIBUTE_GROUPS)),
+    re.IGNORECASE,
+)
+RECIPIENT_PATTERN = re.compile(
+    "|".join(rf"(?P<g{i}>\b(?:{words})\b)" for i, (_, words) in enumerate(_RECIPIENT_GROUPS)),
+    re.IGNORECASE,
+)
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def _parse_number(value):
+    return float(value.replace(" ", "").replace(" ", ""))
+
+
+def _match_attributes(pattern, groups, text):
+    return {groups[int(match.lastgroup[1:])][0] for match in pattern.finditer(text)}
+
+
+def extract_attributes(text, recipients=True):
+    """Атрибуты (вид, значение), упомянутые в тексте; recipients — учитывать "маме", "папе" и т.п."""
+    attributes = _match_attributes(PRODUCT_ATTRIBUTE_PATTERN, _ATTRIBUTE_GROUPS, text)
+    if recipients:
+        attributes |= _match_attributes(RECIPIENT_PATTERN, _RECIPIENT_GROUPS, text)
+    return attributes
+
+
+def _stem(word):
+    """Грубая основа слова для сравнения словоформ: "кофта" и "кофту", "красная" и "красную"."""
+    word = word.lower().replace("ё", "е")
+    return word[:max(3, len(word) - 2)]
+
+
+# Сколько букв может отличать словоформу от основы: окончания вроде "ого", "ыми"
+MAX_ENDING = 3
+
+
+def _has_stem(word, stem):
+    """Слово — форма слова с основой stem: "кофту" для "коф", но не "кофейник" и не "студента" для "сту"."""
+    return word.startswith(stem) and len(word) - len(stem) <= MAX_ENDING
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    """
+    Запрос после разбора: текст для TF-IDF без ценового фильтра и сами фильтры.
+    price_max_inclusive=False соответствует "до N руб" (цена строго меньше N).
+    """
+    text: str
+    price_min: float = None
+    price_max: float = None
+    price_max_inclusive: bool = False
+    categories: tuple = ()
+    attributes: tuple = ()
+
+    @property
+    def filters(self):
+        """Фильтры в виде, пригодном для ключа кэша."""
+        return self.price_min, self.price_max, self.price_max_inclusive, self.categories, self.attributes
+
+
+def parse_price(query):
+    """Выделяет ценовые границы и возвращает (текст без них, минимум, максимум, максимум включительно)."""
+    price_min = price_max = None
+    inclusive = False
+    match = PRICE_RANGE_PATTERN.search(query)
+    if match:
+        low, high = (value for value in match.groups() if value is not None)
+        price_min, price_max, inclusive = _parse_number(low), _parse_number(high), True
+        query = PRICE_RANGE_PATTERN.sub(" ", query)
+    else:
+        match = PRICE_MAX_PATTERN.search(query)
+        if match:
+            price_max = _parse_number(match.group(2))
+            inclusive = match.group(1).lower() != "до"
+            query = PRICE_MAX_PATTERN.sub(" ", query)
+        match = PRICE_MIN_PATTERN.search(query)
+        if match:
+            price_min = _parse_number(match.group(1))
+            query = PRICE_MIN_PATTERN.sub(" ", query)
+    return " ".join(query.split()), price_min, price_max, inclusive
+
+
+class ProductLabels:
+    """
+    Категории и атрибуты товаров в виде номеров для FilterIndex.
+
+    Категории и значения атрибутов интернируются: каждая строка хранится один раз,
+    а товар описывается номером категории и списком номеров атрибутов. Разбор
+    регулярными выражениями выполняется один раз на категорию и на товар, поэтому
+    каталог можно пополнять по мере загрузки без повторного разбора старых товаров.
+    """
+
+    def __init__(self):
+        self.category_names = []
+        self.attribute_keys = []
+        self._category_ids = {}
+        self._category_attributes = []
+        self._attribute_ids = {}
+
+    @classmethod
+    def from_lists(cls, category_names, attribute_keys):
+        """Восстанавливает нумерацию, сохранённую вместе с индексом."""
+        self = cls()
+        for category in category_names:
+            self.label("", category)
+        for attribute in attribute_keys:
+            self._attribute_id(attribute)
+        return self
+
+    def label(self, name, category):
+        """Номер категории и номера атрибутов товара."""
+        category = str(category)
+        category_id = self._category_ids.get(category)
+        if category_id is None:
+            category_id = self._category_ids[category] = len(self.category_names)
+            self.category_names.append(category)
+            self._category_attributes.append(extract_attributes(category, recipients=False))
+        attributes = self._category_attributes[category_id] | extract_attributes(str(name), recipients=False)
+        return category_id, [self._attribute_id(attribute) for attribute in attributes]
+
+    def _attribute_id(self, attribute):
+        attribute_id = self._attribute_ids.get(attribute)
+        if attribute_id is None:
+            attribute_id = self._attribute_ids[attribute] = len(self.attribute_keys)
+            self.attribute_keys.append(attribute)
+        return attribute_id
+
+
+def _group(keys, positions, count):
+    """Отсортированные массивы positions для каждого ключа от 0 до count - 1."""
+    order = np.lexsort((positions, keys))
+    bounds = np.searchsorted(keys[order], np.arange(count + 1))
+    grouped = positions[order]
+    return [grouped[bounds[key]:bounds[key + 1]] for key in range(count)]
+
+
+class FilterIndex:
+    """
+    Индексы для фильтров одной версии каталога.
+
+    Цена: позиции товаров по возрастанию цены, диапазон — срез этого массива.
+    Категории и атрибуты: отсортированные массивы позиций товаров для каждого значения.
+    Атрибуты товара берутся из категории и названия (см. ProductLabels). Товар без значения
+    атрибута (например, без цвета) не противоречит запросу и проходит фильтр по этому атрибуту.
+    Если фильтры по категории и атрибутам вместе с ценой не оставляют ни одного товара,
+    они не применяются, а ограничение по цене остаётся.
+
+    Индекс строится из массивов номеров без разбора строк, поэтому его можно пересобрать
+    после каждого изменения каталога. Удалённые товары (live[position] == False) в него не попадают.
+    """
+
+    def __init__(self, labels, category_ids, attribute_positions, attribute_ids, prices, live=None):
+        self.size = len(prices)
+        positions = np.arange(self.size) if live is None else np.flatnonzero(live)
+        prices = np.asarray(prices)
+        order = np.argsort(prices[positions], kind='stable')
+        self._price_order = positions[order]
+        self._sorted_prices = prices[self._price_order]
+
+        # Если есть удалённые товары, даже запрос без фильтров ограничивается остальными
+        self._live_positions = None if live is None else positions
+
+        self.labels = labels
+        # Копии списков: labels продолжает пополняться следующими загрузками каталога
+        self.category_names = list(labels.category_names)
+        self.attribute_keys = list(labels.attribute_keys)
+        self.category_ids = category_ids
+        self.attribute_positions = attribute_positions
+        self.attribute_ids = attribute_ids
+        self._category_stems = [tuple(_stem(word) for word in WORD_PATTERN.findall(category))
+                                for category in self.category_names]
+        self._category_postings = _group(category_ids[positions], positions, len(self.category_names))
+
+        if live is not None:
+            alive = live[attribute_positions]
+            attribute_positions, attribute_ids = attribute_positions[alive], attribute_ids[alive]
+        postings = _group(attribute_ids, attribute_positions, len(self.attribute_keys))
+        postings = {key: posting for key, posting in zip(self.attribute_keys, postings) if len(posting)}
+        # Товары без атрибута этого вида проходят любой фильтр по нему, поэтому для каждого значения
+        # хранится сразу объединение его товаров с товарами без атрибута: фильтр по одному значению
+        # не сливает списки при каждом запросе
+        kinds = np.array([kind for kind, _ in self.attribute_keys], dtype=object)
+        unlabeled = {}
+        for kind in {kind for kind, _ in postings}:
+            with_kind = np.unique(attribute_positions[kinds[attribute_ids] == kind])
+            unlabeled[kind] = np.setdiff1d(positions, with_kind, assume_unique=True)
+        self._attribute_postings = {
+            (kind, value): np.sort(np.concatenate([posting, unlabeled[kind]]))
+            for (kind, value), posting in postings.items()
+        }
+
+    def parse(self, query):
+        text, price_min, price_max, inclusive = parse_price(query)
+        attributes = tuple(sorted(attribute for attribute in extract_attributes(text)
+                                  if attribute in self._attribute_postings))
+        words = WORD_PATTERN.findall(text.lower().replace("ё", "е"))
+        # Категория указана, если каждое её слово встречается в запросе в какой-либо форме
+        categories = tuple(
+            category_id for category_id, stems in enumerate(self._category_stems)
+            if stems and all(any(_has_stem(word, stem) for word in words) for stem in stems)
+        )
+        return ParsedQuery(text, price_min, price_max, inclusive, categories, attributes)
+
+    def _price_range(self, parsed):
+        """Отсортированные позиции товаров в ценовом диапазоне или None без ограничения цены."""
+        if parsed.price_min is None and parsed.price_max is None:
+            return None
+        start = 0
+        end = len(self._sorted_prices)
+        if parsed.price_min is not None:
+            start = np.searchsorted(self._sorted_prices, parsed.price_min, side='left')
+        if parsed.price_max is not None:
+            side = 'right' if parsed.price_max_inclusive else 'left'
+            end = np.searchsorted(self._sorted_prices, parsed.price_max, side=side)
+        return np.sort(self._price_order[start:max(start, end)])
+
+    def _attribute_allowed(self, kind, values):
+        """Товары с одним из значений атрибута kind или вовсе без этого атрибута."""
+        postings = [self._attribute_postings[(kind, value)] for value in values]
+        if len(postings) == 1:
+            return postings[0]
+        # Списки значений пересекаются по товарам без атрибута, поэтому объединяем их без повторов
+        return functools.reduce(np.union1d, postings)
+
+    def candidates(self, parsed):
+        """Позиции товаров, прошедших фильтры запроса, или None, если ограничений нет."""
+        price = self._price_range(parsed)
+        # Без фильтров по категории и атрибутам остаётся только цена (и исключение удалённых товаров)
+        fallback = price if price is not None else self._live_positions
+        postings = []
+        if parsed.categories:
+            # Товар относится к одной категории, поэтому списки не пересекаются
+            postings.append(np.sort(np.concatenate([self._category_postings[c] for c in parsed.categories])))
+        by_kind = {}
+        for kind, value in parsed.attributes:
+            by_kind.setdefault(kind, []).append(value)
+        for kind, values in by_kind.items():
+            postings.append(self._attribute_allowed(kind, values))
+        if not postings:
+            return fallback
+        if price is not None:
+            postings.append(price)
+        # Пересекаем начиная с самых коротких списков
+        postings.sort(key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, posting, assume_unique=True)
+        return result if len(result) else fallback
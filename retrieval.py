@@ -0,0 +1,230 @@
+"""
+Бэкенды поиска ближайших товаров по TF-IDF векторам.
+
+Все бэкенды принимают вектор запроса (строка CSR с L2-нормой) и необязательный массив
+позиций-кандидатов после фильтров, а возвращают позиции и оценки не более k товаров
+по убыванию оценки. При равной оценке выше идёт товар с большей позицией.
+"""
+import numpy as np
+from scipy import sparse
+
+# Запас для сравнения границ с порогом: товары с оценкой, равной k-й, не должны отсекаться
+# из-за погрешности суммирования в другом порядке
+PRUNING_SLACK = 1e-9
+
+
+def top_k_indices(scores, positions, k):
+    """
+    Индексы k наибольших значений scores по убыванию без полной сортировки.
+    positions задаёт позиции товаров для разрешения равенств (None — сами индексы).
+    """
+    n = len(scores)
+    if positions is None:
+        positions = np.arange(n)
+    if k < n:
+        # Значение k-го по величине score: всё, что больше, точно попадает в выдачу
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)
+        if len(ties) > k - len(above):
+            ties = ties[np.argsort(positions[ties], kind='stable')[len(ties) - (k - len(above)):]]
+        selected = np.concatenate([above, ties])
+    else:
+        selected = np.arange(n)
+    order = np.lexsort((-positions[selected], -scores[selected]))
+    return selected[order]
+
+
+def _select(similarities, candidates, k):
+    if candidates is None:
+        top = top_k_indices(similarities, None, k)
+        return top, similarities[top]
+    scores = similarities[candidates]
+    top = top_k_indices(scores, candidates, k)
+    return candidates[top], scores[top]
+
+
+class ExactBackend:
+    """Точный перебор: близость считается для всех товаров по столбцам терминов запроса."""
+    name = "exact"
+
+    def __init__(self, matrix):
+        # CSC-матрица: запрос затрагивает только столбцы своих терминов
+        self._term_matrix = sparse.csc_matrix(matrix)
+
+    def scores(self, query_vec):
+        """Косинусная близость запроса ко всем товарам (строки матрицы уже нормированы по L2)."""
+        if query_vec.nnz == 0:
+            return np.zeros(self._term_matrix.shape[0])
+        columns = self._term_matrix[:, query_vec.indices]
+        return columns @ query_vec.data
+
+    def top_k(self, query_vec, k, candidates=None):
+        return _select(self.scores(query_vec), candidates, k)
+
+    def top_k_batch(self, query_matrix, k, candidates_list):
+        """top_k для каждой строки query_matrix за одно произведение разреженных матриц."""
+        # Строка i — близость запроса i ко всем товарам; хранятся только ненулевые значения
+        similarities = (query_matrix @ self._term_matrix.T).tocsr()
+        n_products = self._term_matrix.shape[0]
+        for i, candidates in enumerate(candidates_list):
+            start, end = similarities.indptr[i], similarities.indptr[i + 1]
+            scores = np.zeros(n_products)
+            scores[similarities.indices[start:end]] = similarities.data[start:end]
+            yield _select(scores, candidates, k)
+
+    def update(self, matrix, changed_positions):
+        self._term_matrix = sparse.csc_matrix(matrix)
+
+
+class InvertedIndexBackend:
+    """
+    Инвертированный индекс по терминам с постинг-листами, упорядоченными по весу (impact order).
+
+    Термины запроса обходятся по убыванию верхней границы вклада. Как в MaxScore, обход
+    прекращается, когда сумма границ оставшихся терминов не дотягивает до k-й лучшей оценки,
+    а хвост постинг-листа отсекается, когда даже с максимумом по остальным терминам товар
+    не попадёт в top-k. Найденные кандидаты пересчитываются точно по строкам матрицы.
+    При depth=None результат совпадает с точным перебором; depth ограничивает число
+    просматриваемых постингов на термин и делает поиск приближённым, но быстрее.
+    """
+    name = "inverted"
+
+    def __init__(self, matrix, depth=None):
+        self.depth = depth
+        self._build(matrix)
+
+    def _build(self, matrix):
+        self._matrix = sparse.csr_matrix(matrix)
+        csc = sparse.csc_matrix(self._matrix)
+        columns = np.repeat(np.arange(csc.shape[1]), np.diff(csc.indptr))
+        # Внутри каждого столбца постинги по убыванию веса
+        order = np.lexsort((-csc.data, columns))
+        self._indptr = csc.indptr
+        self._docs = csc.indices[order]
+        self._weights = csc.data[order]
+        self._max_weight = np.zeros(csc.shape[1])
+        nonempty = np.diff(csc.indptr) > 0
+        self._max_weight[nonempty] = self._weights[csc.indptr[:-1][nonempty]]
+        # Постинги терминов, изменённых инкрементальными обновлениями после последней сборки
+        self._overrides = {}
+
+    def _postings(self, term):
+        override = self._overrides.get(term)
+        if override is not None:
+            return override
+        if term >= len(self._indptr) - 1:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        start, end = self._indptr[term], self._indptr[term + 1]
+        return self._docs[start:end], self._weights[start:end]
+
+    def _term_bound(self, term):
+        override = self._overrides.get(term)
+        if override is not None:
+            return override[1][0] if len(override[1]) else 0.0
+        return self._max_weight[term] if term < len(self._max_weight) else 0.0
+
+    def top_k(self, query_vec, k, candidates=None):
+        if query_vec.nnz == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        allowed = None
+        if candidates is not None:
+            allowed = np.zeros(self._matrix.shape[0], dtype=bool)
+            allowed[candidates] = True
+
+        bounds = np.array([w * self._term_bound(t) for t, w in zip(query_vec.indices, query_vec.data)])
+        order = np.argsort(-bounds, kind='stable')
+        total_bound = bounds.sum()
+        # remaining[i] — сумма границ терминов, начиная с i-го в порядке обхода
+        remaining = np.concatenate([np.cumsum(bounds[order][::-1])[::-1], [0.0]])
+
+        known = np.empty(0, dtype=np.int64)
+        known_scores = np.empty(0)
+        theta = -np.inf
+        for i, term_pos in enumerate(order):
+            if len(known) >= k and remaining[i] < theta - PRUNING_SLACK:
+                break
+            docs, weights = self._postings(query_vec.indices[term_pos])
+            query_weight = query_vec.data[term_pos]
+            if np.isfinite(theta):
+                # Постинги с весом ниже этого порога не смогут набрать theta даже с остальными терминами
+                min_weight = (theta - PRUNING_SLACK - (total_bound - bounds[term_pos])) / query_weight
+                docs = docs[:np.searchsorted(-weights, -min_weight, side='right')]
+            if allowed is not None:
+                docs = docs[allowed[docs]]
+            if self.depth is not None:
+                docs = docs[:self.depth]
+            new = np.setdiff1d(docs, known)
+            if len(new) == 0:
+                continue
+            new_scores = (self._matrix[new] @ query_vec.T).toarray().ravel()
+            known = np.concatenate([known, new])
+            known_scores = np.concatenate([known_scores, new_scores])
+            if len(known) >= k:
+                theta = np.partition(known_scores, len(known) - k)[len(known) - k]
+
+        top = top_k_indices(known_scores, known, k)
+        return known[top], known_scores[top]
+
+    def top_k_batch(self, query_matrix, k, candidates_list):
+        for i, candidates in enumerate(candidates_list):
+            yield self.top_k(query_matrix[i], k, candidates)
+
+    def update(self, matrix, changed_positions):
+        """
+        Обновляет постинги только тех терминов, что встречаются в старых или новых строках
+        changed_positions. Когда изменённых терминов накапливается много, индекс пересобирается.
+        """
+        matrix = sparse.csr_matrix(matrix)
+        changed = np.unique(np.asarray(changed_positions, dtype=np.int64))
+        old_rows = changed[changed < self._matrix.shape[0]]
+        new_rows = matrix[changed]
+        terms = np.union1d(self._matrix[old_rows].indices, new_rows.indices)
+        new_rows = new_rows.tocsc()
+        # Новый словарь, а не изменение старого: копия бэкенда (copy.copy) не должна менять оригинал
+        self._overrides = dict(self._overrides)
+
+        for term in terms:
+            docs, weights = self._postings(term)
+            keep = ~np.isin(docs, changed)
+            if term < new_rows.shape[1]:
+                start, end = new_rows.indptr[term], new_rows.indptr[term + 1]
+                added_docs, added_weights = changed[new_rows.indices[start:end]], new_rows.data[start:end]
+            else:
+                added_docs, added_weights = np.empty(0, dtype=np.int64), np.empty(0)
+            docs = np.concatenate([docs[keep], added_docs])
+            weights = np.concatenate([weights[keep], added_weights])
+            order = np.argsort(-weights, kind='stable')
+            self._overrides[term] = (docs[order], weights[order])
+        self._matrix = matrix
+
+        if len(self._overrides) > 0.2 * max(len(self._indptr) - 1, 1):
+            self._build(matrix)
+
+
+def make_backend(name, matrix, depth=None):
+    if name == ExactBackend.name:
+        return ExactBackend(matrix)
+    if name == InvertedIndexBackend.name:
+        return InvertedIndexBackend(matrix, depth=depth)
+    raise ValueError(f"неизвестный бэкенд поиска: {name}")
+
+
+def recall_at_k(backend, reference, query_matrix, k, candidates_list=None):
+    """
+    Доля товаров из top-k эталонного бэкенда, которые нашёл backend, усреднённая по запросам.
+    Запросы, у которых эталон ничего не нашёл, не учитываются.
+    """
+    if candidates_list is None:
+        candidates_list = [None] * query_matrix.shape[0]
+    found = expected = 0
+    for i, candidates in enumerate(candidates_list):
+        query_vec = query_matrix[i]
+        ref_positions, ref_scores = reference.top_k(query_vec, k, candidates)
+        ref_positions = set(ref_positions[ref_scores > 0].tolist())
+        if not ref_positions:
+            continue
+        positions, _ = backend.top_k(query_vec, k, candidates)
+        found += len(ref_positions & set(positions.tolist()))
+        expected += len(ref_positions)
+    return found / expected if expected else 1.0
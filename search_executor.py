@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SEARCH_MAX_PENDING, SEARCH_TIMEOUT, SEARCH_WORKERS
+from query_cache import QueryCache
+
+
+class SearchUnavailableError(Exception):
+    """Поиск не уложился в таймаут: исполнитель перегружен или запрос слишком тяжёлый."""
+
+
+class SearchExecutor:
+    """
+    Выполняет ProductSearch.search в пуле потоков, не блокируя event loop.
+
+    Результаты кэшируются по тексту запроса и версии индекса, а одинаковые запросы,
+    пришедшие одновременно, делят одно вычисление. Запрос разбирается только в потоке
+    поиска: ключ кэша не требует разбора в event loop.
+    Число запросов в работе и в очереди ограничено max_pending: когда слоты заняты,
+    новые запросы ждут освобождения слота, но не дольше timeout.
+    """
+
+    def __init__(self, max_workers=SEARCH_WORKERS, max_pending=SEARCH_MAX_PENDING, timeout=SEARCH_TIMEOUT,
+                 cache=None):
+        self.timeout = timeout
+        self.cache = cache if cache is not None else QueryCache()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+        self._slots = asyncio.Semaphore(max_pending)
+        # (версия индекса, текст запроса) -> [задача, число ожидающих обработчиков]
+        self._inflight = {}
+
+    async def search(self, index, query):
+        """Возвращает результат index.search(query) или бросает SearchUnavailableError."""
+        key = (index.version, query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self._run(index, query))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda t: self._forget(key, t))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield: таймаут одного обработчика не должен отменять вычисление для остальных
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            raise SearchUnavailableError(f"поиск не уложился в {self.timeout} с") from None
+        finally:
+            entry[1] -= 1
+            # Результат больше никому не нужен: снимаем задачу, если она ещё ждёт в очереди
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+
+    def _forget(self, key, task):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is None:
+            self.cache.put(key, task.result())
+
+    async def _run(self, index, query):
+        loop = asyncio.get_running_loop()
+        await self._slots.acquire()
+        try:
+            future = self._executor.submit(index.search, query)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Слот освобождается только когда поток действительно закончил работу
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._slots.release))
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+search_executor = SearchExecutor()
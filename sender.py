@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import re
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from config import (
+    SEND_CHAT_BURST, SEND_CHAT_RATE, SEND_GLOBAL_RATE, SEND_GROUP_RATE, SEND_MAX_RETRIES,
+)
+from metrics import TELEGRAM_RETRY_AFTER, TELEGRAM_SECONDS, TELEGRAM_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Предел длины текста одного сообщения Telegram
+MESSAGE_LIMIT = 4096
+PRODUCT_SEPARATOR = "\n\n➖➖➖\n\n"
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд. Ожидающие обслуживаются по очереди."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = self._blocked_until - now
+                if wait <= 0 and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep(max(wait, (1 - self._tokens) / self.rate))
+
+    def idle(self):
+        """Ведро полное и не заблокировано: его можно выбросить без потери ограничений."""
+        now = time.monotonic()
+        return now >= self._blocked_until and self._tokens + (now - self._updated) * self.rate >= self.capacity
+
+    def block(self, seconds):
+        """Запрещает выдачу токенов на seconds секунд (после ответа Telegram retry_after)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Middleware сессии бота, которое выдерживает ограничения Telegram на отправку.
+
+    Каждый запрос с chat_id ждёт токен своего чата (для групп — с меньшей частотой)
+    и общий токен бота. Сообщения в один чат уходят строго по очереди. Если Telegram
+    всё же ответил RetryAfter, чат замолкает на указанное время, а запрос повторяется
+    до max_retries раз.
+    """
+
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST,
+                 group_rate=SEND_GROUP_RATE, max_retries=SEND_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        # chat_id -> [ведро чата, блокировка очерёдности, число запросов в работе]
+        self._chats = {}
+        self._sweep_at = 1024
+        self.retries = 0
+
+    def _chat(self, chat_id):
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            if len(self._chats) >= self._sweep_at:
+                self._sweep()
+            # Отрицательные id — группы и каналы, для них Telegram разрешает около 20 сообщений в минуту
+            rate = self.group_rate if isinstance(chat_id, str) or chat_id < 0 else self.chat_rate
+            entry = self._chats[chat_id] = [TokenBucket(rate, self.chat_burst), asyncio.Lock(), 0]
+        return entry
+
+    def _sweep(self):
+        """Забывает чаты, которым ничего не отправляется и чьи вёдра уже наполнились."""
+        for chat_id, entry in list(self._chats.items()):
+            if entry[2] == 0 and entry[0].idle():
+                del self._chats[chat_id]
+        self._sweep_at = max(1024, 2 * len(self._chats))
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+        entry = self._chat(chat_id)
+        bucket, lock = entry[0], entry[1]
+        entry[2] += 1
+        try:
+            async with lock:
+                for attempt in range(self.max_retries + 1):
+                    with TELEGRAM_WAIT_SECONDS.time():
+                        await bucket.acquire()
+                        await self._global.acquire()
+                    try:
+                        with TELEGRAM_SECONDS.time(type(method).__name__):
+                            return await make_request(bot, method)
+                    except TelegramRetryAfter as e:
+                        TELEGRAM_RETRY_AFTER.inc()
+                        if attempt == self.max_retries:
+                            raise
+                        self.retries += 1
+                        logger.warning("Telegram просит подождать %s с перед отправкой в чат %s", e.retry_after, chat_id)
+                        bucket.block(e.retry_after)
+        finally:
+            entry[2] -= 1
+
+
+def _split_text(text, limit=MESSAGE_LIMIT):
+    """
+    Части текста не длиннее limit: режет по переводам строк, а слишком длинную строку — по пробелам.
+    Теги и HTML-сущности карточек не содержат пробелов и переводов строк, поэтому не разрезаются.
+    """
+    parts, current = [], ""
+    for piece in re.split(r"(?<=[\n ])", text):
+        while len(piece) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(piece[:limit])
+            piece = piece[limit:]
+        if len(current) + len(piece) > limit:
+            parts.append(current)
+            current = ""
+        current += piece
+    if current:
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def product_messages(cards, footer=None):
+    """
+    Объединяет карточки товаров (см. product_cards.ProductCard) в как можно меньше сообщений:
+    тексты идут через разделитель, а под сообщением — кнопки-ссылки на каждый товар.
+    Возвращает список пар (текст, клавиатура); в одно сообщение попадает столько карточек,
+    сколько помещается в MESSAGE_LIMIT символов. Карточка длиннее предела делится на несколько
+    сообщений, кнопка остаётся под последним. footer дописывается в конец последнего сообщения,
+    если помещается, иначе уходит отдельным сообщением без клавиатуры.
+    """
+    messages = []
+    texts, buttons, length = [], [], 0
+
+    def close():
+        messages.append((PRODUCT_SEPARATOR.join(texts), InlineKeyboardMarkup(inline_keyboard=buttons)))
+
+    for card in cards:
+        text = card.text
+        if len(text) > MESSAGE_LIMIT:
+            if texts:
+                close()
+                texts, buttons, length = [], [], 0
+            *head, text = _split_text(text)
+            messages.extend((part, None) for part in head)
+        added = len(text) + (len(PRODUCT_SEPARATOR) if texts else 0)
+        if texts and length + added > MESSAGE_LIMIT:
+            close()
+            texts, buttons, length = [], [], 0
+            added = len(text)
+        texts.append(text)
+        buttons.append([card.button])
+        length += added
+    if texts:
+        close()
+    if footer:
+        if messages and len(messages[-1][0]) + 2 + len(footer) <= MESSAGE_LIMIT:
+            text, keyboard = messages[-1]
+            messages[-1] = (f"{text}\n\n{footer}", keyboard)
+        else:
+            messages.append((footer, None))
+    return messages
+
+
+async def answer_products(message, cards, footer=None):
+    """Отправляет карточки товаров в чат message, объединив их по product_messages."""
+    for text, keyboard in product_messages(cards, footer):
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+send_scheduler = SendScheduler()
@@ -0,0 +1,145 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import os
+import tempfile
+import zlib
+
+from aiogram.types import FSInputFile
+
+from config import EXPORT_PART_BYTES
+from session_log import FIELDNAMES, segment_range
+
+# Столько строк журнала читается и сжимается за один заход в потоке
+BLOCK_ROWS = 5000
+
+
+class ExportFilterError(ValueError):
+    """Некорректные аргументы команды /sessions."""
+
+
+def parse_export_filters(args):
+    """
+    Разбирает аргументы /sessions: from=ГГГГ-ММ-ДД, to=ГГГГ-ММ-ДД, user=<id или username>.
+    Возвращает словарь с ключами date_from, date_to, user.
+    """
+    filters = {"date_from": None, "date_to": None, "user": None}
+    for arg in (args or "").split():
+        key, sep, value = arg.partition("=")
+        if not sep or not value:
+            raise ExportFilterError(f"не понимаю аргумент {arg}")
+        if key in ("from", "to"):
+            try:
+                filters[f"date_{key}"] = datetime.date.fromisoformat(value)
+            except ValueError:
+                raise ExportFilterError(f"дата {value} должна быть в формате ГГГГ-ММ-ДД") from None
+        elif key == "user":
+            filters["user"] = value.removeprefix("@")
+        else:
+            raise ExportFilterError(f"неизвестный фильтр {key}")
+    return filters
+
+
+class SessionExport:
+    """
+    Потоковая выгрузка журналов сессий всех воркеров в TSV, сжатый gzip.
+
+    Строки читаются только из сегментов, пересекающихся с диапазоном дат, и сжимаются
+    часть за частью во временный файл. Если сжатые данные превышают part_bytes, выгрузка
+    делится на части: каждая часть — самостоятельный .tsv.gz с заголовком.
+    """
+
+    def __init__(self, logs, date_from=None, date_to=None, user=None, part_bytes=EXPORT_PART_BYTES):
+        # Журналы всех воркеров вебхука (см. session_log.worker_logs)
+        self.logs = logs
+        self.date_from = date_from.isoformat() if date_from else None
+        self.date_to = date_to.isoformat() if date_to else None
+        self.user = user
+        self.part_bytes = part_bytes
+        self.parts_sent = 0
+        self._rows = None
+        self._pending = None
+
+    def _segments(self, log):
+        for path in log.segments():
+            bounds = segment_range(path)
+            if bounds is not None:
+                first, last = (value.date().isoformat() for value in bounds)
+                if (self.date_from and last < self.date_from) or (self.date_to and first > self.date_to):
+                    continue
+            yield path
+
+    def _matches(self, row):
+        # Неполная последняя запись журнала, который сейчас дописывает другой воркер
+        if row.get("text") is None:
+            return False
+        day = row["timestamp"][:10]
+        if self.date_from and day < self.date_from:
+            return False
+        if self.date_to and day > self.date_to:
+            return False
+        return self.user is None or self.user in (row["user_id"], row["username"])
+
+    def _iter_log_rows(self, log):
+        for path in self._segments(log):
+            for row in log.iter_segment(path):
+                if self._matches(row):
+                    yield row
+
+    def _iter_rows(self):
+        # Журналы воркеров упорядочены по времени каждый, выгрузка сливает их в общий порядок
+        return heapq.merge(*(self._iter_log_rows(log) for log in self.logs), key=lambda row: row["timestamp"])
+
+    def _read_block(self):
+        """Следующие BLOCK_ROWS подходящих строк в виде TSV-байтов или b"" в конце журнала."""
+        lines = ["\t".join(row[field] for field in FIELDNAMES) + "\n"
+                 for row in itertools.islice(self._rows, BLOCK_ROWS)]
+        return "".join(lines).encode("utf-8")
+
+    async def has_rows(self):
+        """Начинает чтение журнала и сообщает, есть ли хотя бы одна подходящая строка."""
+        if self._rows is None:
+            self._rows = self._iter_rows()
+            self._pending = await asyncio.to_thread(self._read_block)
+        return bool(self._pending)
+
+    @property
+    def exhausted(self):
+        return self._rows is not None and self._pending == b""
+
+    async def next_part(self):
+        """
+        Следующая часть выгрузки для answer_document. Часть целиком пишется во временный файл,
+        поэтому её можно отправить повторно (например, после RetryAfter); файл удаляет вызывающий.
+        """
+        self.parts_sent += 1
+        fd, path = tempfile.mkstemp(prefix="sessions_export_", suffix=".tsv.gz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                await asyncio.to_thread(self._write_part, f)
+        except BaseException:
+            os.remove(path)
+            raise
+        return FSInputFile(path, filename=f"sessions_export_{self.parts_sent}.tsv.gz")
+
+    def _write_part(self, f):
+        """Сжимает в f строки журнала, пока часть не приблизится к part_bytes или журнал не закончится."""
+        if self._rows is None:
+            self._rows = self._iter_rows()
+        compressor = zlib.compressobj(wbits=31)  # формат gzip
+        written = f.write(compressor.compress(("\t".join(FIELDNAMES) + "\n").encode("utf-8")))
+        while True:
+            block, self._pending = self._pending, None
+            if block is None:
+                block = self._read_block()
+            if not block:
+                self._pending = b""
+                break
+            written += f.write(compressor.compress(block))
+            # Запас на ещё один несжатый блок: часть не должна выйти за предел размера документа
+            if written + 2 * len(block) >= self.part_bytes:
+                # Читаем следующий блок сразу, чтобы exhausted знал, есть ли ещё строки
+                self._pending = self._read_block()
+                break
+        f.write(compressor.flush())
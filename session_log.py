@@ -0,0 +1,332 @@
+import asyncio
+import csv
+import datetime
+import glob
+import gzip
+import io
+import logging
+import os
+import re
+import shutil
+
+from config import (
+    SESSION_LOG_BATCH_SIZE, SESSION_LOG_FLUSH_INTERVAL, SESSION_LOG_GZIP,
+    SESSION_LOG_MAX_AGE, SESSION_LOG_MAX_BYTES, SESSIONS_LOG_BASE, SESSIONS_LOG_FILE,
+)
+from metrics import STAGE_SECONDS, metrics
+from worker_files import worker_paths
+
+logger = logging.getLogger(__name__)
+
+FIELDNAMES = ["timestamp", "user_id", "username", "event", "text"]
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Формат времени в именах сегментов: sessions.20240101T000000-20240102T000000.csv.gz
+SEGMENT_TIME_FORMAT = "%Y%m%dT%H%M%S"
+SEGMENT_PATTERN = re.compile(r"\.(\d{8}T\d{6})-(\d{8}T\d{6})(?:\.(\d+))?\.csv(?:\.gz)?$")
+
+
+def segment_range(path):
+    """Время первой и последней записи закрытого сегмента по его имени или None для активного файла."""
+    match = SEGMENT_PATTERN.search(path)
+    if match is None:
+        return None
+    first, last = (datetime.datetime.strptime(value, SEGMENT_TIME_FORMAT) for value in match.group(1, 2))
+    return first, last
+
+
+def _segment_key(path):
+    match = SEGMENT_PATTERN.search(path)
+    return match.group(1), match.group(2), int(match.group(3) or 0)
+
+
+class SessionLogReader:
+    """
+    Чтение журнала сессий одного воркера: закрытые сегменты и активный файл.
+
+    Через этот класс читаются и журналы других воркеров вебхука, пока их пишут другие
+    процессы: iter_since читает только целые записи и запоминает, до какого места дочитан
+    каждый файл, поэтому следующий вызов продолжит с того же места даже после ротации.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._base, self._ext = os.path.splitext(path)
+
+    def segments(self):
+        """Пути всех сегментов в хронологическом порядке; активный файл идёт последним."""
+        closed = {}
+        for path in glob.glob(f"{glob.escape(self._base)}.*{self._ext}*"):
+            if SEGMENT_PATTERN.search(path) is None:
+                continue
+            # Во время сжатия сегмент может на мгновение существовать в обоих видах
+            closed.setdefault(path.removesuffix(".gz"), path)
+        return [closed[name] for name in sorted(closed, key=_segment_key)] + [self.path]
+
+    def iter_since(self, position):
+        """
+        Построчно читает события ([timestamp, user_id, username, event, text]), записанные после
+        position, и по мере чтения обновляет position на месте. Пустой словарь — с начала журнала.
+
+        position хранит имена прочитанных сегментов и для файлов, прочитанных не до конца,
+        смещение по времени их первой записи: активный файл после ротации становится сегментом
+        с тем же началом, и он дочитывается с сохранённого смещения.
+        """
+        known = position.setdefault("segments", [])
+        partial = position.setdefault("files", {})
+        for path in self.segments()[:-1]:
+            name = _segment_name(path)
+            if name in known:
+                continue
+            first = segment_range(path)[0].strftime(TIMESTAMP_FORMAT)
+            try:
+                raw = gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+            except FileNotFoundError:
+                # Сегмент сжали между получением списка и открытием: он попадёт в следующий вызов
+                continue
+            with raw:
+                yield from _Records(raw, partial.get(first, 0), complete=True)
+            partial.pop(first, None)
+            known.append(name)
+        try:
+            raw = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with raw:
+            first = _first_timestamp(raw)
+            if first is None:
+                return
+            offset = partial.get(first, 0)
+            records = _Records(raw, offset)
+            yield from records
+            partial[first] = offset + records.end
+
+    def iter_segment(self, path):
+        """Построчно читает события одного сегмента из списка segments()."""
+        try:
+            f = _open_segment(path)
+        except FileNotFoundError:
+            # Сегмент сжали между получением списка и открытием
+            if path.endswith(".gz") or not os.path.exists(f"{path}.gz"):
+                return
+            f = _open_segment(f"{path}.gz")
+        with f:
+            yield from csv.DictReader(f)
+
+
+class SessionLog(SessionLogReader):
+    """
+    Журнал событий сессий с буферизованной записью из фоновой задачи.
+
+    События складываются в очередь и пишутся пачками не реже раза в flush_interval секунд.
+    Активный файл ротируется, когда превышает max_bytes или его первая запись старше
+    max_age секунд; закрытые сегменты называются по времени первой и последней записи
+    и при compress=True сжимаются gzip. Чтение (см. SessionLogReader) охватывает все сегменты.
+    """
+
+    def __init__(self, path, flush_interval=SESSION_LOG_FLUSH_INTERVAL, batch_size=SESSION_LOG_BATCH_SIZE,
+                 max_bytes=SESSION_LOG_MAX_BYTES, max_age=SESSION_LOG_MAX_AGE, compress=SESSION_LOG_GZIP):
+        super().__init__(path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._listeners = []
+        self._ensure_active()
+        with open(self.path, "rb") as raw:
+            self._first_timestamp = _first_timestamp(raw)
+
+    def _ensure_active(self):
+        if not os.path.exists(self.path):
+            with open(self.path, mode="w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(FIELDNAMES)
+
+    def add_listener(self, listener):
+        """Подписывает listener на события: listener.apply(rows) вызывается в event loop при каждой записи."""
+        self._listeners.append(listener)
+
+    def write(self, user_id, username, event, text):
+        """Ставит событие в очередь на запись; не блокирует обработчик."""
+        timestamp = datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
+        row = [timestamp, user_id, username, event, text]
+        self._queue.put_nowait(row)
+        for listener in self._listeners:
+            listener.apply([row])
+
+    def position(self):
+        """
+        Позиция конца журнала для iter_since. События из очереди в неё не входят,
+        поэтому вызывается после flush(), пока в очередь ничего не добавили.
+        """
+        with open(self.path, "rb") as raw:
+            first = _first_timestamp(raw)
+            end = raw.seek(0, os.SEEK_END)
+        return {
+            "segments": [_segment_name(path) for path in self.segments()[:-1]],
+            "files": {} if first is None else {first: end},
+        }
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await asyncio.to_thread(self._append, batch)
+            except Exception:
+                # Задача должна жить: иначе очередь никто не разберёт и flush() будет ждать вечно
+                logger.exception("Не удалось записать %d событий в %s", len(batch), self.path)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _append(self, rows):
+        with STAGE_SECONDS.time("session_log_write"):
+            self._append_rows(rows)
+
+    def _append_rows(self, rows):
+        self._ensure_active()
+        with open(self.path, mode="a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
+        if self._first_timestamp is None:
+            self._first_timestamp = rows[0][0]
+        if self._should_rotate():
+            self._rotate(rows[-1][0])
+
+    def _should_rotate(self):
+        if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+            return True
+        started = _parse_timestamp(self._first_timestamp)
+        # Если время первой записи повреждено (файл из прошлых запусков), возраст файла неизвестен
+        if self.max_age and started is not None:
+            return (datetime.datetime.now() - started).total_seconds() >= self.max_age
+        return False
+
+    def _rotate(self, last_timestamp):
+        """Переименовывает активный файл в закрытый сегмент и начинает новый."""
+        last_time = _parse_timestamp(last_timestamp) or datetime.datetime.now()
+        first_time = _parse_timestamp(self._first_timestamp) or last_time
+        first, last = (value.strftime(SEGMENT_TIME_FORMAT) for value in (first_time, last_time))
+        segment = f"{self._base}.{first}-{last}{self._ext}"
+        suffix = 1
+        while os.path.exists(segment) or os.path.exists(f"{segment}.gz"):
+            segment = f"{self._base}.{first}-{last}.{suffix}{self._ext}"
+            suffix += 1
+        os.replace(self.path, segment)
+        self._first_timestamp = None
+        self._ensure_active()
+        if self.compress:
+            with open(segment, "rb") as src, gzip.open(f"{segment}.gz.tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(f"{segment}.gz.tmp", f"{segment}.gz")
+            os.remove(segment)
+
+    async def flush(self):
+        """Дожидается записи всех событий, поставленных в очередь."""
+        if self._task is not None:
+            await self._queue.join()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Записывает оставшиеся в очереди события и останавливает фоновую задачу."""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # События, записанные до запуска задачи или после её остановки
+        rows = []
+        while not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+            self._queue.task_done()
+        if rows:
+            self._append(rows)
+
+
+def _segment_name(path):
+    return os.path.basename(path).removesuffix(".gz")
+
+
+def _parse_timestamp(value):
+    """Время записи журнала или None, если строка времени повреждена."""
+    try:
+        return datetime.datetime.strptime(value, TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def _first_timestamp(raw):
+    """Время первой записи файла журнала или None, если целой записи в нём ещё нет."""
+    raw.seek(0)
+    f = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    reader = csv.reader(f)
+    next(reader, None)
+    row = next(reader, None)
+    f.detach()
+    # Неполная запись, которую сейчас дописывает другой процесс, не даёт всех полей
+    return row[0] if row is not None and len(row) == len(FIELDNAMES) else None
+
+
+class _Records:
+    """
+    Записи файла журнала начиная со смещения offset (0 — с начала, заголовок пропускается).
+    Если complete=False, файл ещё пишется: читаются только записи, за которыми уже есть
+    перевод строки, а end после чтения — смещение конца последней прочитанной записи.
+    """
+
+    def __init__(self, raw, offset, complete=False):
+        raw.seek(offset)
+        data = raw.read()
+        self.end = len(data) if complete else data.rfind(b"\r\n") + 2
+        if self.end < 2:
+            self.end = 0
+        reader = csv.reader(io.StringIO(data[:self.end].decode("utf-8"), newline=""))
+        if offset == 0:
+            next(reader, None)
+        self._rows = (row for row in reader if len(row) == len(FIELDNAMES))
+
+    def __iter__(self):
+        return self._rows
+
+
+def _open_segment(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode="rt", newline="", encoding="utf-8")
+    return open(path, mode="r", newline="", encoding="utf-8")
+
+
+session_log = SessionLog(SESSIONS_LOG_FILE)
+metrics.gauge("gift_bot_session_log_queue", "События в очереди на запись в журнал сессий",
+              func=lambda: session_log._queue.qsize())
+
+_readers = {}
+
+
+def other_worker_logs():
+    """Журналы остальных воркеров вебхука, которые пишут другие процессы."""
+    return [_readers.setdefault(path, SessionLogReader(path))
+            for path in worker_paths(SESSIONS_LOG_BASE) if path != session_log.path]
+
+
+def worker_logs():
+    """Журналы всех воркеров вебхука: журнал этого процесса (session_log) и файлы остальных."""
+    return [session_log] + other_worker_logs()
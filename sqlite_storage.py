@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+from config import FSM_BATCH_SIZE, FSM_CLEANUP_INTERVAL, FSM_FLUSH_INTERVAL, FSM_STORAGE_FILE, FSM_TTL
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+)
+"""
+UPSERT_STATE = (
+    "INSERT INTO fsm (key, state, updated_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at"
+)
+UPSERT_DATA = (
+    "INSERT INTO fsm (key, data, updated_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at"
+)
+# Пустые записи (состояние сброшено, данных нет) не храним
+DELETE_EMPTY = "DELETE FROM fsm WHERE key = ? AND state IS NULL AND data = '{}'"
+
+
+def _storage_key(key):
+    """Строковый ключ записи из StorageKey aiogram; отсутствующие поля пропускаются."""
+    parts = [key.bot_id, key.chat_id, key.user_id,
+             getattr(key, "thread_id", None), getattr(key, "business_connection_id", None),
+             getattr(key, "destiny", "default")]
+    return ":".join("" if part is None else str(part) for part in parts)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в файле SQLite.
+
+    База открывается в режиме WAL, поэтому несколько процессов бота на одной машине
+    могут работать с одним файлом: читатели не блокируют писателя, а писатели ждут
+    друг друга не дольше busy_timeout. Записи, не обновлявшиеся дольше ttl секунд
+    (брошенные уточнения), считаются отсутствующими и периодически удаляются.
+
+    Изменения из разных обработчиков собираются в пачки за flush_interval секунд
+    и фиксируются одной транзакцией; set_state и set_data возвращаются после фиксации.
+    """
+
+    def __init__(self, path=FSM_STORAGE_FILE, ttl=FSM_TTL, flush_interval=FSM_FLUSH_INTERVAL,
+                 batch_size=FSM_BATCH_SIZE, cleanup_interval=FSM_CLEANUP_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.cleanup_interval = cleanup_interval
+        # Все обращения к соединению идут из одного потока
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm")
+        self._connection = self._executor.submit(self._connect).result()
+        self._queue = None
+        self._task = None
+        self._last_cleanup = time.monotonic()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=30000")
+        connection.execute(SCHEMA)
+        return connection
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _fetch(self, key, column):
+        row = self._connection.execute(
+            f"SELECT {column}, updated_at FROM fsm WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (self.ttl and row[1] < time.time() - self.ttl):
+            return None
+        return row[0]
+
+    async def get_state(self, key):
+        return await self._call(self._fetch, _storage_key(key), "state")
+
+    async def get_data(self, key):
+        data = await self._call(self._fetch, _storage_key(key), "data")
+        return json.loads(data) if data else {}
+
+    async def set_state(self, key, state=None):
+        value = state.state if isinstance(state, State) else state
+        await self._submit(UPSERT_STATE, _storage_key(key), value)
+
+    async def set_data(self, key, data):
+        await self._submit(UPSERT_DATA, _storage_key(key), json.dumps(dict(data), ensure_ascii=False))
+
+    async def _submit(self, statement, key, value):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((statement, key, value, future))
+        await future
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._call(self._commit, [item[:3] for item in batch])
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _commit(self, writes):
+        now = time.time()
+        cleanup = self.ttl and time.monotonic() - self._last_cleanup >= self.cleanup_interval
+        # IMMEDIATE сразу берёт блокировку записи, чтобы не упереться в занятую базу посреди транзакции
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            for statement, key, value in writes:
+                self._connection.execute(statement, (key, value, now))
+            self._connection.executemany(DELETE_EMPTY, {(key,) for _, key, _ in writes})
+            if cleanup:
+                self._connection.execute("DELETE FROM fsm WHERE updated_at < ?", (now - self.ttl,))
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        if cleanup:
+            self._last_cleanup = time.monotonic()
+
+    async def close(self):
+        """Фиксирует накопленные изменения и закрывает соединение."""
+        if self._task is not None:
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._call(self._connection.close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,13 @@
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Модули бота при импорте создают журнал сессий и другие файлы в текущем каталоге, а index_manager
+# собирает индекс по dataset.csv: тесты работают во временном каталоге с копией каталога товаров,
+# чтобы не трогать файлы рабочего бота
+os.chdir(tempfile.mkdtemp(prefix="gift-bot-tests-"))
+shutil.copy(os.path.join(ROOT, "dataset.csv"), "dataset.csv")
@@ -0,0 +1,56 @@
+"""Агрегаты журнала сессий (analytics.py): учёт на лету, восстановление из сохранения и пересчёт совпадают."""
+import asyncio
+
+from analytics import SessionAggregates
+from session_log import SessionLog, SessionLogReader
+
+
+def _summary(aggregates):
+    failed, failed_total = aggregates.failed_queries()
+    # Порядок событий разных воркеров при учёте на лету и при пересчёте может отличаться
+    return aggregates.event_counts, aggregates.queries, aggregates.converted, failed_total, sorted(failed)
+
+
+def test_live_restore_and_rebuild_agree(tmp_path):
+    own_path, other_path = str(tmp_path / "sessions.csv"), str(tmp_path / "sessions-1.csv")
+    other_logs = [SessionLogReader(other_path)]
+    live = SessionAggregates(str(tmp_path / "stats.json"), checkpoint_interval=3600)
+
+    async def write(own, other, start, stop):
+        for i in range(start, stop):
+            user = f"u{i % 4}"
+            own.write(user, "user", "query", f"запрос {i}")
+            if i % 3:
+                own.write(user, "user", "result_sent", None)
+            # Пользователи второго воркера не пересекаются с первым
+            other.write(f"w{i % 5}", "user", "query", f"другой {i}")
+            if i % 2:
+                other.write(f"w{i % 5}", "user", "result_sent", None)
+        await own.flush()
+        await other.flush()
+
+    async def run():
+        own = SessionLog(own_path, flush_interval=0.01, max_bytes=700, max_age=0, compress=True)
+        other = SessionLog(other_path, flush_interval=0.01, max_bytes=700, max_age=0, compress=True)
+        own.start()
+        other.start()
+        live.start(own, lambda: other_logs)
+        await write(own, other, 0, 20)
+        # События своего журнала учтены сразу, без чтения файла
+        assert live.event_counts["query"] == 20
+        await live.refresh(other_logs)
+        await live.checkpoint(own)
+        await write(own, other, 20, 40)
+        await other.close()
+        await live.close(own, other_logs)
+        await own.close()
+
+    asyncio.run(run())
+    logs = [SessionLogReader(own_path)] + other_logs
+    assert len(logs[0].segments()) > 2 and len(logs[1].segments()) > 2
+    restored = SessionAggregates(str(tmp_path / "stats.json"))
+    restored.restore(logs)
+    rebuilt = SessionAggregates(str(tmp_path / "rebuilt.json"))
+    rebuilt.rebuild(logs)
+    assert _summary(live) == _summary(restored) == _summary(rebuilt)
+    assert live.queries == 80
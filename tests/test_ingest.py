@@ -0,0 +1,156 @@
+"""Загрузка каталога (ingest.py): дельта с последующим уплотнением даёт тот же индекс, что полная пересборка."""
+import asyncio
+import csv
+import random
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_queries, write_catalog
+from data import ProductSearch
+from index_manager import IndexManager
+from ingest import Catalog
+
+STOP_WORDS = ["и", "в", "на", "с", "для"]
+
+
+def _read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f, delimiter=";")
+        header = next(reader)
+        return header, list(reader)
+
+
+def _write_rows(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+def _load(path):
+    catalog = Catalog(STOP_WORDS)
+    catalog.apply(path)
+    return catalog
+
+
+def _terms(catalog):
+    terms = np.empty(len(catalog.vocabulary), dtype=object)
+    for term, column in catalog.vocabulary.items():
+        terms[column] = term
+    return terms
+
+
+def _key(results):
+    results, need_clarification = results
+    return [(r['name'], r['link'], round(float(r['score']), 9)) for r in results], bool(need_clarification)
+
+
+@pytest.fixture(scope="module")
+def catalogs(tmp_path_factory):
+    """Каталог после дельты и уплотнения и каталог, собранный заново из итогового CSV."""
+    tmp = tmp_path_factory.mktemp("ingest")
+    header, rows = _read_rows(write_catalog(str(tmp / "full.csv"), 1000, vocabulary_size=1500))
+    extra_header, extra = _read_rows(write_catalog(str(tmp / "extra.csv"), 300, vocabulary_size=1500, seed=5))
+    rng = random.Random(3)
+    removed = set(rng.sample([row[0] for row in rows], 150))
+    updated = dict(zip(rng.sample([row[0] for row in rows if row[0] not in removed], 100), extra[:100]))
+    added = [[f"new-{row[0]}"] + row[1:] for row in extra[100:]]
+
+    delta = [["remove", product_id, "", "", "", "", ""] for product_id in sorted(removed)]
+    delta += [["update", product_id] + row[1:] for product_id, row in updated.items()]
+    delta += [["add"] + row for row in added]
+    rng.shuffle(delta)
+    delta_file = _write_rows(str(tmp / "delta.csv"), ["op"] + header, delta)
+
+    # Итоговый каталог: обновлённые товары остаются на своих местах, новые идут в конце в порядке дельты
+    expected = [[row[0]] + updated[row[0]][1:] if row[0] in updated else row
+                for row in rows if row[0] not in removed] + [row[1:] for row in delta if row[0] == "add"]
+    expected_file = _write_rows(str(tmp / "expected.csv"), header, expected)
+
+    catalog = _load(str(tmp / "full.csv"))
+    _, report = catalog.apply(delta_file)
+    assert (report.removed, report.updated, report.added, report.bad) == (150, 100, 200, 0)
+    assert catalog.dirty
+    catalog.compact()
+    return catalog, _load(expected_file)
+
+
+def test_compacted_delta_matches_rebuild_products(catalogs):
+    compacted, rebuilt = catalogs
+    assert not compacted.dirty
+    assert compacted.size == rebuilt.size == len(compacted.products) == len(rebuilt.products)
+    for field in ("id", "name", "description", "link"):
+        assert list(compacted.products.column(field)) == list(rebuilt.products.column(field))
+    assert np.array_equal(compacted.products.prices, rebuilt.products.prices)
+    assert [compacted.products.category(p) for p in range(len(compacted.products))] == \
+        [rebuilt.products.category(p) for p in range(len(rebuilt.products))]
+
+
+def test_compacted_delta_matches_rebuild_weights(catalogs):
+    compacted, rebuilt = catalogs
+    terms = _terms(compacted)
+    assert set(terms) == set(rebuilt.vocabulary)
+    # Номера терминов после уплотнения идут в порядке появления в словаре, а не как при пересборке
+    order = np.array([rebuilt.vocabulary[term] for term in terms])
+    assert np.array_equal(compacted.doc_freq, rebuilt.doc_freq[order])
+    assert np.allclose(compacted.idf, rebuilt.idf[order])
+    assert np.allclose(compacted.tfidf.toarray(), rebuilt.tfidf[:, order].toarray())
+
+
+def test_compacted_delta_matches_rebuild_search(catalogs):
+    compacted, rebuilt = (ProductSearch.from_catalog(catalog, None) for catalog in catalogs)
+    # Запросы с фильтрами тоже сверяются: метки категорий и атрибутов должны совпасть
+    for query in make_queries(200, vocabulary_size=1500):
+        assert _key(compacted.search(query)) == _key(rebuilt.search(query)), query
+
+
+def test_index_manager_delta_then_compact_matches_rebuild(tmp_path):
+    header, rows = _read_rows(write_catalog(str(tmp_path / "dataset.csv"), 500, vocabulary_size=1500))
+    _, extra = _read_rows(write_catalog(str(tmp_path / "extra.csv"), 50, vocabulary_size=1500, seed=7))
+    delta = _write_rows(str(tmp_path / "delta.csv"), ["op"] + header,
+                        [["remove", row[0], "", "", "", "", ""] for row in rows[:20]]
+                        + [["update", rows[100][0]] + extra[0][1:]]
+                        + [["add", f"new-{row[0]}"] + row[1:] for row in extra[1:]])
+    manager = IndexManager(str(tmp_path / "dataset.csv"), compact_interval=0)
+
+    async def apply():
+        await manager.apply_delta(delta)
+        assert not manager.current.compacted
+        await manager.compact()
+
+    asyncio.run(apply())
+    # apply_delta переписывает dataset.csv, и полная пересборка по нему должна дать ту же выдачу
+    rebuilt = ProductSearch(str(tmp_path / "dataset.csv"))
+    assert manager.current.compacted and manager.current.products_count == rebuilt.products_count == 529
+    for query in make_queries(100, vocabulary_size=1500):
+        assert _key(manager.current.search(query)) == _key(rebuilt.search(query)), query
+
+
+def test_rows_without_name_are_indexed(tmp_path):
+    path = _write_rows(str(tmp_path / "catalog.csv"), ["id", "name", "description", "category", "price", "link"], [
+        ["1", "Кружка белая", "керамическая кружка", "Посуда", "300", "l1"],
+        ["2", "", "подарочный набор чая", "Чай", "500", "l2"],
+    ])
+    catalog = Catalog(STOP_WORDS)
+    _, report = catalog.apply(path)
+    assert (report.rows, report.bad, catalog.size) == (2, 0, 2)
+    results, _ = ProductSearch.from_catalog(catalog, None).search("набор чая")
+    assert results[0]["link"] == "l2"
+
+
+def test_bad_rows_reported_in_line_order(tmp_path):
+    path = _write_rows(str(tmp_path / "catalog.csv"), ["id", "name", "description", "category", "price", "link"], [
+        ["1", "Кружка", "керамическая кружка", "Посуда", "300", "l1"],
+    ])
+    catalog = _load(path)
+    # Строки 2 и 3 отбраковываются при применении к каталогу, 4 и 5 — ещё при разборе
+    delta = _write_rows(str(tmp_path / "delta.csv"), ["op", "id", "name", "description", "category", "price", "link"], [
+        ["update", "99", "Чашка", "фарфор", "Посуда", "100", "l2"],
+        ["add", "1", "Кружка", "керамика", "Посуда", "100", "l3"],
+        ["move", "3", "", "", "", "", ""],
+        ["add", "4", "Ложка", "серебро", "Посуда", "дорого", "l4"],
+    ])
+    _, report = catalog.apply(delta)
+    assert [line for line, _ in report.bad_rows] == [2, 3, 4, 5]
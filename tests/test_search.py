@@ -0,0 +1,32 @@
+"""Выдача ProductSearch совпадает с эталонной реализацией до векторизации (benchmarks/legacy_search.py)."""
+import pytest
+
+from benchmarks.legacy_search import LegacyProductSearch
+from benchmarks.synthetic import make_queries, write_catalog
+from data import ProductSearch
+
+
+def _key(results):
+    results, need_clarification = results
+    return [(r['name'], r['link'], round(float(r['score']), 9)) for r in results], bool(need_clarification)
+
+
+@pytest.fixture(scope="module")
+def search(tmp_path_factory):
+    csv_file = write_catalog(str(tmp_path_factory.mktemp("catalog") / "catalog.csv"), 3000, vocabulary_size=2000)
+    return ProductSearch(csv_file)
+
+
+def test_ranking_matches_legacy(search):
+    legacy = LegacyProductSearch(search)
+    queries = make_queries(300, vocabulary_size=2000)
+    # У эталона нет фильтров по категории и атрибутам (см. query_parser.py)
+    checked = [q for q in queries if not (search.filters.parse(q).categories or search.filters.parse(q).attributes)]
+    assert len(checked) > len(queries) // 2
+    for query in checked:
+        assert _key(search.search(query)) == _key(legacy.search(query)), query
+
+
+def test_batch_matches_single(search):
+    queries = make_queries(100, seed=2, vocabulary_size=2000)
+    assert [_key(r) for r in search.search_batch(queries)] == [_key(search.search(q)) for q in queries]
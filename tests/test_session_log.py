@@ -0,0 +1,90 @@
+"""Журнал сессий (session_log.py): ротация сегментов и дочитывание журнала, который пишет другой процесс."""
+import asyncio
+import csv
+import json
+
+from session_log import SessionLog, SessionLogReader
+
+
+def _texts(rows):
+    return [row[4] for row in rows]
+
+
+def test_tailing_across_rotation(tmp_path):
+    path = str(tmp_path / "sessions.csv")
+    written, read = [], []
+    # Позиция хранится между вызовами как в сохранении агрегатов: через JSON
+    position = "{}"
+
+    def tail():
+        nonlocal position
+        current = json.loads(position)
+        read.extend(SessionLogReader(path).iter_since(current))
+        position = json.dumps(current)
+
+    async def run():
+        log = SessionLog(path, flush_interval=0.01, max_bytes=600, max_age=0, compress=True)
+        log.start()
+        for batch in range(30):
+            for i in range(7):
+                text = f"запрос {batch}-{i}"
+                log.write(batch, "user", "query", text)
+                written.append(text)
+            await log.flush()
+            if batch % 4 == 0:
+                tail()
+        await log.close()
+
+    asyncio.run(run())
+    tail()
+    reader = SessionLogReader(path)
+    segments = reader.segments()
+    assert len(segments) > 5
+    assert all(segment.endswith(".csv.gz") for segment in segments[:-1])
+    # Каждое событие прочитано ровно один раз и в порядке записи
+    assert _texts(read) == written
+    # Новый читатель с нуля видит тот же журнал
+    assert _texts(reader.iter_since({})) == written
+    assert [row["text"] for segment in segments for row in reader.iter_segment(segment)] == written
+
+
+def test_incomplete_record_is_read_once_complete(tmp_path):
+    path = str(tmp_path / "sessions.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "user_id", "username", "event", "text"])
+        writer.writerow(["2024-01-01 10:00:00", "1", "user", "query", "кружка"])
+    reader = SessionLogReader(path)
+    position = {}
+    assert _texts(reader.iter_since(position)) == ["кружка"]
+
+    # Другой процесс дописал запись не до конца
+    with open(path, "ab") as f:
+        f.write("2024-01-01 10:00:05,1,user,query,ча".encode("utf-8"))
+    assert list(reader.iter_since(position)) == []
+    with open(path, "ab") as f:
+        f.write("шка\r\n".encode("utf-8"))
+    assert _texts(reader.iter_since(position)) == ["чашка"]
+    assert list(reader.iter_since(position)) == []
+
+
+def test_writer_survives_malformed_timestamp(tmp_path):
+    path = str(tmp_path / "sessions.csv")
+    # Первая запись активного файла из прошлых запусков с повреждённым временем
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "user_id", "username", "event", "text"])
+        writer.writerow(["не время", "1", "user", "query", "кружка"])
+
+    async def run():
+        log = SessionLog(path, flush_interval=0.01, max_bytes=200, max_age=60, compress=False)
+        log.start()
+        for i in range(5):
+            log.write(1, "user", "query", f"чашка {i}")
+            await log.flush()
+        await log.close()
+
+    asyncio.run(run())
+    reader = SessionLogReader(path)
+    assert len(reader.segments()) > 1
+    assert _texts(reader.iter_since({})) == ["кружка"] + [f"чашка {i}" for i in range(5)]
@@ -0,0 +1,74 @@
+"""FSM-хранилище в SQLite (sqlite_storage.py): запись и чтение, общий файл и срок жизни записей."""
+import asyncio
+import sqlite3
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+
+from sqlite_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=100)
+OTHER_KEY = StorageKey(bot_id=1, chat_id=20, user_id=200)
+
+
+def _rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT key, state, data FROM fsm ORDER BY key").fetchall()
+    finally:
+        connection.close()
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+
+    async def run():
+        storage = SQLiteStorage(path, ttl=3600)
+        await asyncio.gather(
+            storage.set_state(KEY, "Search:clarify"),
+            storage.set_data(KEY, {"query": "кружка", "attempt": 2}),
+            storage.set_state(OTHER_KEY, "Admin:upload"),
+        )
+        assert await storage.get_state(KEY) == "Search:clarify"
+        assert await storage.get_data(KEY) == {"query": "кружка", "attempt": 2}
+        assert await storage.get_data(OTHER_KEY) == {}
+        await storage.close()
+
+        # Другой процесс бота с тем же файлом видит зафиксированные изменения
+        reopened = SQLiteStorage(path, ttl=3600)
+        assert await reopened.get_state(KEY) == "Search:clarify"
+        assert await reopened.get_state(OTHER_KEY) == "Admin:upload"
+        # Сброшенное состояние без данных не хранится
+        await reopened.set_state(OTHER_KEY, None)
+        assert await reopened.get_state(OTHER_KEY) is None
+        await reopened.close()
+
+    asyncio.run(run())
+    assert [key for key, _, _ in _rows(path)] == ["1:10:100:::default"]
+
+
+def test_expired_records(tmp_path, monkeypatch):
+    path = str(tmp_path / "fsm.sqlite3")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+
+    async def run():
+        nonlocal now
+        storage = SQLiteStorage(path, ttl=60, cleanup_interval=0)
+        await storage.set_state(KEY, "Search:clarify")
+        await storage.set_data(KEY, {"query": "кружка"})
+        now += 59
+        assert await storage.get_state(KEY) == "Search:clarify"
+
+        now += 2
+        # Брошенное уточнение считается отсутствующим, даже если его ещё не удалили
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_data(KEY) == {}
+        assert len(_rows(path)) == 1
+
+        # Очистка при следующей записи удаляет просроченные записи
+        await storage.set_state(OTHER_KEY, "Admin:upload")
+        await storage.close()
+
+    asyncio.run(run())
+    assert [key for key, _, _ in _rows(path)] == ["1:20:200:::default"]
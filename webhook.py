@@ -0,0 +1,194 @@
+"""
+Приём обновлений Telegram через вебхук вместо long polling.
+
+    python webhook.py                      # WEBHOOK_WORKERS процессов на WEBHOOK_HOST:WEBHOOK_PORT
+    python webhook.py --no-set-webhook     # без регистрации вебхука в Telegram, для локальной проверки
+
+Локально записанное обновление можно отправить так:
+
+    curl -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" -H "Content-Type: application/json" \\
+         -d @update.json http://127.0.0.1:8080/webhook
+
+Несколько процессов слушают один порт (SO_REUSEPORT), состояние FSM у них общее при
+FSM_STORAGE=sqlite (см. sqlite_storage.py), а журнал сессий и счётчики популярности каждый процесс
+ведёт в своих файлах (см. WORKER_ID в config.py), а /stats, /sessions и популярные товары
+читают файлы всех воркеров (см. worker_files.py). Поисковый индекс собирается до запуска
+воркеров, и все они отображают в память одни и те же файлы (см. product_store.py); версию,
+которую после /update_dataset сохранил один воркер, остальные подхватывают из INDEX_DIR.
+"""
+import argparse
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+from aiogram.types import Update
+from aiohttp import web
+
+from config import (
+    DATASET_FILE, FSM_STORAGE, INDEX_DIR, WEBHOOK_DRAIN_TIMEOUT, WEBHOOK_HOST, WEBHOOK_MAX_CONCURRENCY, WEBHOOK_PATH,
+    WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL, WEBHOOK_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """
+    Принимает обновления от Telegram и передаёт их диспетчеру aiogram.
+
+    Ответ отправляется сразу после постановки обновления в обработку, но не больше
+    max_concurrency обновлений обрабатываются одновременно: когда слоты заняты, ответ
+    задерживается и Telegram сам притормаживает доставку. При остановке новые обновления
+    отклоняются с 503 (Telegram доставит их повторно), а начатые дорабатываются
+    не дольше drain_timeout секунд.
+    """
+
+    def __init__(self, dp, bot, secret=WEBHOOK_SECRET, max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+                 drain_timeout=WEBHOOK_DRAIN_TIMEOUT):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.drain_timeout = drain_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._tasks = set()
+        self._draining = False
+
+    async def handle(self, request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        if self._draining:
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError:
+            return web.Response(status=400)
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            logger.exception("Ошибка при обработке обновления %s", update.update_id)
+        finally:
+            self._slots.release()
+
+    async def drain(self, app=None):
+        """Перестаёт принимать обновления и дожидается обработки уже принятых."""
+        self._draining = True
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+        if pending:
+            logger.warning("Не дождались обработки %d обновлений за %s с", len(pending), self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def create_app(dp, bot, set_webhook=True):
+    """aiohttp-приложение вебхука; хуки запуска и остановки диспетчера вызываются вместе с ним."""
+    handler = WebhookHandler(dp, bot)
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+
+    async def on_startup(app):
+        await dp.emit_startup(bot=bot, **workflow_data)
+        if set_webhook:
+            await bot.set_webhook(
+                f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+
+    async def on_cleanup(app):
+        try:
+            await dp.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handler.handle)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(handler.drain)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def serve(host, port, set_webhook, reuse_port=False):
+    """Запускает один процесс вебхука до SIGINT/SIGTERM."""
+    # Импорт здесь: настройки процесса (WORKER_ID) должны быть известны до загрузки обработчиков
+    from main import create_bot, create_dispatcher
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_app(create_dispatcher(), create_bot(), set_webhook)
+    web.run_app(app, host=host, port=port, reuse_port=reuse_port,
+                shutdown_timeout=WEBHOOK_DRAIN_TIMEOUT, print=None)
+
+
+def run(host=WEBHOOK_HOST, port=WEBHOOK_PORT, workers=WEBHOOK_WORKERS, set_webhook=True):
+    """Запускает workers процессов на одном порту; вебхук регистрирует только воркер 0."""
+    if workers <= 1:
+        serve(host, port, set_webhook)
+        return
+    logging.basicConfig(level=logging.INFO)
+    if FSM_STORAGE != "sqlite":
+        # Уточнение может прийти в другой процесс, который не знает о заданном вопросе
+        logger.warning("FSM_STORAGE=%s: состояние диалогов не общее для %d воркеров, включите FSM_STORAGE=sqlite",
+                       FSM_STORAGE, workers)
+    # Индекс собирается один раз здесь, воркеры только отображают его файлы в память
+    from data import ensure_index
+    ensure_index(DATASET_FILE, INDEX_DIR)
+
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for index in range(workers):
+        # Дочерний процесс наследует окружение, из которого config.py берёт WORKER_ID
+        os.environ["BOT_WORKER_ID"] = str(index)
+        process = context.Process(target=serve, args=(host, port, set_webhook and index == 0, True),
+                                  name=f"webhook-{index}")
+        process.start()
+        processes.append(process)
+    os.environ.pop("BOT_WORKER_ID", None)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for process in processes:
+            process.join()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        # SIGTERM запускает в воркерах штатную остановку с дообработкой принятых обновлений
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бот в режиме вебхука")
+    parser.add_argument("--host", default=WEBHOOK_HOST)
+    parser.add_argument("--port", type=int, default=WEBHOOK_PORT)
+    parser.add_argument("--workers", type=int, default=WEBHOOK_WORKERS, help="число процессов")
+    parser.add_argument("--no-set-webhook", action="store_true",
+                        help="не вызывать setWebhook (локальная проверка записанными обновлениями)")
+    args = parser.parse_args()
+
+    if not WEBHOOK_SECRET:
+        parser.error("задайте WEBHOOK_SECRET")
+    if not args.no_set_webhook and not WEBHOOK_URL:
+        parser.error("задайте WEBHOOK_URL или запустите с --no-set-webhook")
+    run(args.host, args.port, args.workers, not args.no_set_webhook)
+
+
+if __name__ == '__main__':
+    main()
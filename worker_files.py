@@ -0,0 +1,21 @@
+"""
+Файлы, которые воркеры вебхука ведут каждый свой (см. WORKER_SUFFIX в config.py): воркер 0
+пишет в основной файл, воркер N — в файл с суффиксом -N. Команды, которые показывают данные
+всех воркеров (/stats, /sessions, популярные товары), читают файлы всех воркеров.
+"""
+import os
+import re
+
+
+def worker_paths(path):
+    """Существующие файлы всех воркеров по имени файла воркера 0: sessions.csv, sessions-1.csv, ..."""
+    directory, name = os.path.split(path)
+    base, ext = os.path.splitext(name)
+    pattern = re.compile(rf"{re.escape(base)}-(\d+){re.escape(ext)}")
+    numbered = []
+    for entry in os.listdir(directory or "."):
+        match = pattern.fullmatch(entry)
+        if match is not None:
+            numbered.append((int(match.group(1)), os.path.join(directory, entry)))
+    paths = [path] if os.path.exists(path) else []
+    return paths + [numbered_path for _, numbered_path in sorted(numbered)]